@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks for the notebook toolbox
+
+Usage:
+
+    python benchmark.py
+    python benchmark.py --cells 5000 --images 20 --json results.json
+    python benchmark.py --baseline benchmark-baseline.json
+    python benchmark.py --write-baseline benchmark-baseline.json
+"""
+
+# Python Standard Library
+import argparse
+import base64
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+# Third-Party Libraries
+import numpy as np
+import PIL.Image  # pillow
+
+import notebook_v0 as toolbox
+import notebook_v1
+import notebook_v2
+
+BASELINE = "benchmark-baseline.json"
+
+
+def make_cell_dicts(count, lines=2):
+    r"""
+    Build `count` code and markdown cells (dicts), alternately, with
+    `lines` lines of source each.
+
+    Usage:
+
+        >>> cells = make_cell_dicts(2)
+        >>> [cell["cell_type"] for cell in cells]
+        ['code', 'markdown']
+        >>> cells[0]["source"]
+        ['x0 = 0\n', 'print(x0)']
+    """
+    cells = []
+    for index in range(count):
+        if index % 2 == 0:
+            cells.append({
+                "cell_type": "code",
+                "execution_count": index,
+                "id": f"{index:08x}",
+                "metadata": {},
+                "outputs": [],
+                "source": [f"x{index} = {index}\n"] * (lines - 1) + [f"print(x{index})"],
+            })
+        else:
+            cells.append({
+                "cell_type": "markdown",
+                "id": f"{index:08x}",
+                "metadata": {},
+                "source": [f"Cell {index}\n"] * (lines - 1) + ["======"],
+            })
+    return cells
+
+
+def make_png(shape=(64, 64, 3), seed=0):
+    r"""
+    Return a random PNG image of the given shape, base64-encoded (str) as
+    in the outputs of a notebook.
+
+    Usage:
+
+        >>> toolbox.decode_png(make_png((4, 2, 3))).shape
+        (4, 2, 3)
+    """
+    pixels = np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+    buffer = io.BytesIO()
+    PIL.Image.fromarray(pixels).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def make_notebook(count, lines=2, output_bytes=0, images=0, image_shape=(64, 64, 3)):
+    r"""
+    Build a synthetic notebook (dict) of `count` cells (see
+    `make_cell_dicts`); each code cell gets a stdout stream output of about
+    `output_bytes` characters (one short line if 0), and the first `images`
+    code cells also get a PNG image output of shape `image_shape`.
+
+    Usage:
+
+        >>> ipynb = make_notebook(4, output_bytes=100, images=1)
+        >>> len(ipynb["cells"]), ipynb["nbformat"]
+        (4, 4)
+        >>> [output["output_type"] for output in ipynb["cells"][0]["outputs"]]
+        ['stream', 'display_data']
+        >>> len(toolbox.get_stream(ipynb))
+        200
+    """
+    line = "o" * (max(output_bytes, 3) - 1) + "\n"
+    png = make_png(image_shape) if images else None
+    cells = make_cell_dicts(count, lines)
+    for cell in cells:
+        if cell["cell_type"] != "code":
+            continue
+        cell["outputs"] = [{"name": "stdout", "output_type": "stream", "text": [line]}]
+        if images > 0:
+            images -= 1
+            cell["outputs"].append({
+                "data": {"image/png": png, "text/plain": ["<Figure>"]},
+                "metadata": {},
+                "output_type": "display_data",
+            })
+    return {"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}
+
+
+def measure(function, repeat=3):
+    r"""
+    Return the best wall time (in seconds) of a call of `function` and
+    the peak memory (in bytes) allocated during one more call, as a dict.
+
+    The time is the best of `repeat` runs, each of them long enough
+    (at least 0.2 s, see `timeit.Timer.autorange`) for stable results.
+
+    Usage:
+
+        >>> result = measure(lambda: bytearray(10**6))
+        >>> sorted(result)
+        ['peak_bytes', 'seconds']
+        >>> result["peak_bytes"] >= 10**6
+        True
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat, number)) / number
+    gc.collect()
+    tracemalloc.start()     # à part: tracemalloc ralentit les allocations
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak}
+
+
+def run_suite(cells=2000, lines=5, output_bytes=200, images=4, image_shape=(256, 256, 3),
+              repeat=3):
+    r"""
+    Time the public conversion and extraction entry points of the toolbox
+    on a synthetic notebook (see `make_notebook`), and return the results
+    as a JSON-serializable dict, with the parameters of the run.
+    """
+    ipynb = make_notebook(cells, lines, output_bytes, images, image_shape)
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "notebook.ipynb")
+        percent = os.path.join(directory, "notebook.py")
+        output = os.path.join(directory, "output.ipynb")
+        toolbox.save_ipynb(ipynb, filename)
+        with open(percent, "w", encoding="utf-8") as file:
+            toolbox.to_percent(ipynb, file)
+        nb1 = notebook_v1.Notebook(ipynb)
+
+        def load_notebook():
+            toolbox.PARSE_CACHE.clear()     # chargement à froid
+            return notebook_v2.NotebookLoader(filename).load()
+
+        entry_points = {
+            "load_ipynb": lambda: toolbox.load_ipynb(filename),
+            "save_ipynb": lambda: toolbox.save_ipynb(ipynb, output),
+            "to_percent": lambda: toolbox.to_percent(ipynb),
+            "to_starboard": lambda: toolbox.to_starboard(ipynb),
+            "get_images": lambda: toolbox.get_images(ipynb),
+            "get_stream": lambda: toolbox.get_stream(ipynb),
+            "Serializer.serialize": lambda: notebook_v1.Serializer(nb1).serialize(),
+            "Outliner.outline": lambda: notebook_v1.Outliner(nb1).outline(),
+            "NotebookLoader.load": load_notebook,
+            "PyPercentLoader.load": lambda: notebook_v2.PyPercentLoader(percent).load(),
+        }
+        results = {name: measure(function, repeat) for name, function in entry_points.items()}
+        size = os.path.getsize(filename)
+    return {
+        "parameters": {
+            "cells": cells, "lines": lines, "output_bytes": output_bytes,
+            "images": images, "image_shape": list(image_shape), "repeat": repeat,
+            "file_bytes": size,
+        },
+        "python": platform.python_version(),
+        "json_backend": toolbox.JSON_BACKEND,
+        "results": results,
+    }
+
+
+def mismatches(results, baseline):
+    r"""
+    Return what makes benchmark results and baseline results (both as
+    returned by `run_suite`) not comparable, as a list of str: other
+    parameters, another Python version (major.minor) or another JSON
+    backend.
+
+    Usage:
+
+        >>> baseline = {"parameters": {"cells": 10}, "python": "3.11.7", "json_backend": "orjson"}
+        >>> mismatches({"parameters": {"cells": 10}, "python": "3.11.9", "json_backend": "json"},
+        ...            baseline)
+        ["json_backend: 'orjson' -> 'json'"]
+    """
+    res = []
+    if baseline.get("parameters") != results.get("parameters"):
+        res.append("parameters: the baseline was run with other parameters")
+    versions = [run.get("python", "").split(".")[:2] for run in (baseline, results)]
+    if versions[0] != versions[1]:
+        res.append(f"python: {baseline.get('python')!r} -> {results.get('python')!r}")
+    if baseline.get("json_backend") != results.get("json_backend"):
+        res.append(f"json_backend: {baseline.get('json_backend')!r} -> {results.get('json_backend')!r}")
+    return res
+
+
+def compare(results, baseline, tolerance=0.25, check=True):
+    r"""
+    Compare benchmark results with baseline results (both as returned by
+    `run_suite`), and return the regressions: the entry points which got
+    slower, or used more memory, by more than `tolerance` (a fraction), as
+    a list of str.
+
+    Raise a ValueError if the results are not comparable (see
+    `mismatches`), unless `check` is false.
+
+    Usage:
+
+        >>> baseline = {"results": {"f": {"seconds": 1.0, "peak_bytes": 100}}}
+        >>> compare({"results": {"f": {"seconds": 1.1, "peak_bytes": 200}}}, baseline)
+        ['f: peak_bytes 100 -> 200 (+100%)']
+        >>> compare({"results": {"f": {"seconds": 1.1, "peak_bytes": 100}}}, baseline)
+        []
+        >>> compare({"results": {}, "json_backend": "json"}, baseline)
+        Traceback (most recent call last):
+          ...
+        ValueError: the results are not comparable with the baseline: json_backend: None -> 'json'
+    """
+    if check:
+        problems = mismatches(results, baseline)
+        if problems:
+            raise ValueError("the results are not comparable with the baseline: "
+                             + "; ".join(problems))
+    regressions = []
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            old, new = reference[metric], result[metric]
+            if old > 0 and new > old * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {old:g} -> {new:g} ({new / old - 1:+.0%})")
+    return regressions
+
+
+def json_backends(filenames=None, repeat=5):
+    r"""
+    Return the best time (in seconds) to load each notebook file with each
+    JSON backend of the toolbox, and to save it, as a dict by filename.
+
+    The default files are "samples/images.ipynb" and two synthetic
+    notebooks: 20 000 small cells, and 200 cells with ~100 KB outputs.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        if filenames is None:
+            filenames = ["samples/images.ipynb"]
+            for name, ipynb in [("many-cells", make_notebook(20_000)),
+                                ("large-outputs", make_notebook(200, output_bytes=100_000))]:
+                filenames.append(os.path.join(directory, f"{name}.ipynb"))
+                toolbox.save_ipynb(ipynb, filenames[-1])
+        results = {}
+        try:
+            for filename in filenames:
+                timings = {}
+                for backend in toolbox.JSON_BACKENDS:
+                    toolbox.use_json_backend(backend)
+                    timings[f"load ({backend})"] = min(timeit.repeat(
+                        lambda: toolbox.load_ipynb(filename), number=1, repeat=repeat))
+                ipynb = toolbox.load_ipynb(filename)
+                output = os.path.join(directory, "output.ipynb")
+                timings["save"] = min(timeit.repeat(
+                    lambda: toolbox.save_ipynb(ipynb, output), number=1, repeat=repeat))
+                results[os.path.basename(filename)] = timings
+        finally:
+            toolbox.use_json_backend()
+    return results
+
+
+def bytes_per_object(build, items):
+    r"""
+    Return the memory allocated (in bytes) per object when building one
+    object for each item with `build`.
+
+    Usage:
+
+        >>> bytes_per_object(list, [(1, 2)] * 100) > 0
+        True
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [build(item) for item in items]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    # la liste qui garde les objets en vie n'est pas comptée
+    return (after - before - objects.__sizeof__()) / len(objects)
+
+
+def cell_memory(count=100_000):
+    r"""
+    Return the memory used per cell (in bytes) by the cell classes of
+    notebook_v1 and notebook_v2, as a dict: the cell objects and the lists
+    they own, but not the loaded dicts, which the notebook_v1 cells share
+    with the parse cache (and copy their source from on first access).
+    """
+    cells = make_cell_dicts(count)
+    v2_build = {
+        "code": lambda cell: notebook_v2.CodeCell(cell["id"], cell["source"], cell["execution_count"]),
+        "markdown": lambda cell: notebook_v2.MarkdownCell(cell["id"], cell["source"]),
+    }
+    return {
+        "notebook_v1": bytes_per_object(notebook_v1.Notebook.make_cell, cells),
+        "notebook_v2": bytes_per_object(lambda cell: v2_build[cell["cell_type"]](cell), cells),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cells", type=int, default=2000, help="number of cells")
+    parser.add_argument("--lines", type=int, default=5, help="lines of source per cell")
+    parser.add_argument("--output-bytes", type=int, default=200,
+                        help="size of the stream output of each code cell")
+    parser.add_argument("--images", type=int, default=4, help="number of PNG images")
+    parser.add_argument("--image-size", type=int, default=256,
+                        help="width and height of the images")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per entry point")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON ('-': stdout)")
+    parser.add_argument("--baseline", metavar="FILE", nargs="?", const=BASELINE,
+                        help="compare with baseline results (default: %(const)s); "
+                             "exit with status 1 on regressions")
+    parser.add_argument("--ignore-mismatches", action="store_true",
+                        help="compare with a baseline run with other parameters, another"
+                             " Python version or another JSON backend (only warn)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline (a fraction)")
+    parser.add_argument("--write-baseline", metavar="FILE", nargs="?", const=BASELINE,
+                        help="store the results as baseline results (default: %(const)s)")
+    parser.add_argument("--memory-per-cell", action="store_true",
+                        help="also measure the memory used per cell object")
+    parser.add_argument("--json-backends", action="store_true",
+                        help="also compare the JSON backends")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.cells, args.lines, args.output_bytes, args.images,
+                        (args.image_size, args.image_size, 3), args.repeat)
+    for name, result in results["results"].items():
+        print(f"{name:22} {result['seconds'] * 1000:10.2f} ms"
+              f" {result['peak_bytes'] / 2**20:10.2f} MiB peak", file=sys.stderr)
+    if args.memory_per_cell:
+        for module, size in cell_memory().items():
+            print(f"{module}: {size:.0f} bytes per cell", file=sys.stderr)
+    if args.json_backends:
+        for filename, timings in json_backends().items():
+            for operation, seconds in timings.items():
+                print(f"{filename}: {operation}: {seconds * 1000:.1f} ms", file=sys.stderr)
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.write_baseline:
+        with open(args.write_baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        problems = mismatches(results, baseline)
+        for problem in problems:
+            print(f"{'warning' if args.ignore_mismatches else 'error'}: {problem}",
+                  file=sys.stderr)
+        if problems and not args.ignore_mismatches:
+            print("error: the baseline is not comparable (see --ignore-mismatches)",
+                  file=sys.stderr)
+            return 2
+        regressions = compare(results, baseline, args.tolerance, check=False)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+opt-in instrumentation of the notebook toolbox
+
+The key functions of notebook_v0, notebook_v1 and notebook_v2 record, per
+stage (a name such as "load_ipynb" or "png.decode"), their number of
+calls, their wall time and the bytes and cells they processed. Nothing is
+recorded until the instrumentation is enabled, with `enable()` or with the
+environment variable NOTEBOOK_INSTRUMENTATION=1; while it is disabled, an
+instrumented call only costs a flag check.
+
+The times of nested stages are inclusive (the time of "load_ipynb"
+contains the time of its "json.parse"), and each process has its own
+records (the worker processes of `toolbox.extract_images` for instance).
+
+Usage:
+
+    >>> import notebook_v0 as toolbox
+    >>> enable()
+    >>> _ = toolbox.load_ipynb("samples/hello-world.ipynb")
+    >>> stats = snapshot(reset=True)["load_ipynb"]
+    >>> stats["calls"], stats["bytes_read"], stats["cells"]
+    (1, 639, 3)
+    >>> disable()
+"""
+
+# Python Standard Library
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+
+COUNTERS = ("calls", "seconds", "bytes_read", "bytes_written", "cells")
+
+_enabled = os.environ.get("NOTEBOOK_INSTRUMENTATION", "") not in ("", "0")
+_records = {}       # nom de l'étape -> [calls, seconds, bytes_read, bytes_written, cells]
+_lock = threading.Lock()
+_NULL_STAGE = contextlib.nullcontext()
+
+logger = logging.getLogger("notebook.instrumentation")
+
+
+def enable():
+    r"""
+    Start recording the instrumented stages.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    r"""
+    Stop recording the instrumented stages (the records are kept).
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def record(name, seconds=0.0, calls=1, bytes_read=0, bytes_written=0, cells=0):
+    r"""
+    Add a call (or only some counters, with `calls=0`) to the records of
+    the stage `name`, even if the instrumentation is disabled.
+    """
+    with _lock:
+        counters = _records.get(name)
+        if counters is None:
+            counters = _records[name] = [0, 0.0, 0, 0, 0]
+        counters[0] += calls
+        counters[1] += seconds
+        counters[2] += bytes_read
+        counters[3] += bytes_written
+        counters[4] += cells
+
+
+def count(name, bytes_read=0, bytes_written=0, cells=0):
+    r"""
+    Add some bytes or cells to the records of the stage `name`, without
+    counting a call, if the instrumentation is enabled.
+    """
+    if _enabled:
+        record(name, calls=0, bytes_read=bytes_read, bytes_written=bytes_written, cells=cells)
+
+
+class _Stage:
+    __slots__ = ("name", "counters", "start")
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = counters
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start, **self.counters)
+
+
+def stage(name, bytes_read=0, bytes_written=0, cells=0):
+    r"""
+    Return a context manager which records a call of the stage `name`
+    (its wall time and the given counters) if the instrumentation is
+    enabled, and does nothing otherwise.
+
+    Usage:
+
+        >>> enable()
+        >>> with stage("example", bytes_read=10):
+        ...     pass
+        >>> snapshot(reset=True)["example"]["bytes_read"]
+        10
+        >>> disable()
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, {"bytes_read": bytes_read, "bytes_written": bytes_written, "cells": cells})
+
+
+def instrumented(name, bytes_read=None, bytes_written=None, cells=None):
+    r"""
+    Decorate a function to record its calls as the stage `name` while the
+    instrumentation is enabled. The optional `bytes_read`, `bytes_written`
+    and `cells` are functions which compute these counters from the value
+    returned by the function (only when it is recorded).
+
+    Usage:
+
+        >>> @instrumented("double", cells=len)
+        ... def double(cells):
+        ...     return cells + cells
+        >>> enable()
+        >>> double([1, 2])
+        [1, 2, 1, 2]
+        >>> stats = snapshot(reset=True)["double"]
+        >>> stats["calls"], stats["cells"]
+        (1, 4)
+        >>> disable()
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                record(name, time.perf_counter() - start)
+                raise
+            record(
+                name, time.perf_counter() - start,
+                bytes_read=bytes_read(result) if bytes_read else 0,
+                bytes_written=bytes_written(result) if bytes_written else 0,
+                cells=cells(result) if cells else 0,
+            )
+            return result
+        return wrapper
+    return decorate
+
+
+def snapshot(reset=False):
+    r"""
+    Return the records of all the stages, as a dict of dicts (see
+    `COUNTERS`), and clear them if `reset` is true.
+    """
+    with _lock:
+        res = {name: dict(zip(COUNTERS, counters)) for name, counters in _records.items()}
+        if reset:
+            _records.clear()
+    return res
+
+
+def reset():
+    r"""
+    Clear the records of all the stages.
+    """
+    snapshot(reset=True)
+
+
+def format_snapshot(stats):
+    r"""
+    Format a snapshot as a single log line, the slowest stages first.
+
+    Usage:
+
+        >>> format_snapshot({"load_ipynb": {"calls": 2, "seconds": 0.0125,
+        ...     "bytes_read": 1278, "bytes_written": 0, "cells": 6}})
+        'load_ipynb calls=2 ms=12.5 read=1278 written=0 cells=6'
+    """
+    stages = sorted(stats.items(), key=lambda item: item[1]["seconds"], reverse=True)
+    return " | ".join(
+        f"{name} calls={counters['calls']} ms={counters['seconds'] * 1000:.1f}"
+        f" read={counters['bytes_read']} written={counters['bytes_written']}"
+        f" cells={counters['cells']}"
+        for name, counters in stages
+    )
+
+
+def log_periodically(interval=60.0, reset=True, level=logging.INFO):
+    r"""
+    Log a snapshot line (see `format_snapshot`) every `interval` seconds,
+    from a daemon thread, with the logger "notebook.instrumentation"; the
+    records are cleared after each line if `reset` is true, so that each
+    line covers one interval. Return a function which stops the logging.
+    """
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            stats = snapshot(reset=reset)
+            if stats:
+                logger.log(level, format_snapshot(stats))
+
+    threading.Thread(target=run, name="notebook-instrumentation", daemon=True).start()
+    return stopped.set
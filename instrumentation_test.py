@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+import os
+import threading
+import unittest
+
+import notebook_v0 as toolbox
+import notebook_v1
+import notebook_v2
+from instrumentation import *
+import instrumentation
+
+class Instrumentation(unittest.TestCase):
+    def setUp(self):
+        reset()
+        enable()
+
+    def tearDown(self):
+        disable()
+        reset()
+
+    def test_nothing_is_recorded_when_disabled(self):
+        disable()
+        toolbox.load_ipynb("samples/hello-world.ipynb")
+        with stage("example"):
+            pass
+        self.assertEqual({}, snapshot())
+
+    def test_stages_of_the_toolbox(self):
+        toolbox.get_images(toolbox.load_ipynb("samples/images.ipynb"))
+        stats = snapshot()
+        size = os.path.getsize("samples/images.ipynb")
+        self.assertEqual(size, stats["load_ipynb"]["bytes_read"])
+        self.assertEqual(size, stats["json.parse"]["bytes_read"])
+        self.assertEqual(4, stats["load_ipynb"]["cells"])
+        self.assertEqual(1, stats["get_images"]["calls"])
+        self.assertEqual(1, stats["base64.decode"]["calls"])
+        self.assertLess(stats["png.decode"]["bytes_read"], stats["base64.decode"]["bytes_read"])
+        for name in ("load_ipynb", "json.parse", "png.decode"):
+            self.assertGreater(stats[name]["seconds"], 0)
+
+    def test_bytes_written_to_a_file(self):
+        ipynb = toolbox.load_ipynb("samples/hello-world.ipynb")
+        for convert in (toolbox.to_percent, toolbox.to_starboard):
+            text = convert(ipynb)
+            convert(ipynb, file=io.StringIO())
+            stats = snapshot(reset=True)[convert.__name__]
+            self.assertEqual(2, stats["calls"])
+            self.assertEqual(2 * len(text.encode("utf-8")), stats["bytes_written"])
+
+    def test_notebook_classes(self):
+        toolbox.PARSE_CACHE.clear()
+        notebook_v1.Notebook.from_file("samples/hello-world.ipynb")
+        nb = notebook_v2.NotebookLoader("samples/hello-world.ipynb").load()
+        notebook_v1.Serializer(nb).serialize()
+        list(toolbox.iter_cells("samples/hello-world.ipynb"))
+        stats = snapshot(reset=True)
+        self.assertEqual(3, stats["Notebook.from_file"]["cells"])
+        self.assertEqual(3, stats["NotebookLoader.load"]["cells"])
+        self.assertEqual(3, stats["Serializer.serialize"]["cells"])
+        self.assertEqual(3, stats["iter_cells"]["cells"])
+        self.assertEqual(2, stats["ParseCache.load"]["calls"])
+        self.assertEqual({}, snapshot())
+
+    def test_failed_calls_are_recorded(self):
+        with self.assertRaises(FileNotFoundError):
+            toolbox.load_ipynb("samples/missing.ipynb")
+        self.assertEqual(1, snapshot()["load_ipynb"]["calls"])
+
+    def test_periodic_log(self):
+        logged = threading.Event()
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                if "load_ipynb calls=1 " in record.getMessage():
+                    logged.set()
+
+        handler = Handler()
+        instrumentation.logger.addHandler(handler)
+        instrumentation.logger.setLevel(logging.INFO)
+        stop = log_periodically(0.01, reset=False)
+        try:
+            toolbox.load_ipynb("samples/minimal.ipynb")
+            self.assertTrue(logged.wait(5))
+        finally:
+            stop()
+            instrumentation.logger.removeHandler(handler)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+an on-disk cache of notebook conversions (py-percent, starboard, markdown)
+
+Usage:
+
+    python notebook_cache.py --warm samples
+    python notebook_cache.py samples/hello-world.ipynb --to percent
+"""
+
+# Python Standard Library
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import notebook_v0 as toolbox
+from notebook_v1 import Serializer
+from notebook_v2 import CorpusLoader, NotebookLoader, Markdownizer
+
+
+def markdown_ipynb(ipynb):
+    r"""
+    Convert a notebook (dict) to a pure markdown notebook (as .ipynb JSON text).
+    """
+    nb = Markdownizer(NotebookLoader.from_ipynb(ipynb)).markdownize()
+    return json.dumps(Serializer(nb).serialize())
+
+
+# les convertisseurs, par nom: (version, fonction notebook (dict) -> str)
+# la version doit changer dès que la sortie d'un convertisseur change
+CONVERTERS = {
+    "percent": (1, toolbox.to_percent),
+    "starboard": (1, toolbox.to_starboard),
+    "starboard-html": (1, lambda ipynb: toolbox.to_starboard(ipynb, html=True)),
+    "markdown": (1, markdown_ipynb),
+}
+
+
+def default_directory():
+    r"""
+    Return the default cache directory: $NOTEBOOK_CACHE_DIR if set, or
+    ~/.cache/notebook-toolbox.
+    """
+    directory = os.environ.get("NOTEBOOK_CACHE_DIR")
+    if directory:
+        return Path(directory)
+    return Path.home() / ".cache" / "notebook-toolbox"
+
+
+class ConversionCache:
+    r"""An on-disk cache of the conversions of notebooks.
+
+    A conversion is stored under a key made of the hash of the notebook
+    content, the converter name and the converter version, so unchanged
+    notebooks are converted only once, whatever their filename. The least
+    recently used conversions are removed once the cache grows beyond
+    `max_bytes`. The conversions are stored as UTF-8 bytes, so a cached
+    text is exactly the text returned by the converter (line ends included).
+
+    Args:
+        directory (str): The cache directory (see `default_directory`).
+        max_bytes (int): The maximum size of the cached conversions.
+
+    Usage:
+
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as directory:
+        ...     cache = ConversionCache(directory)
+        ...     code = cache.convert("samples/hello-world.ipynb", "percent")
+        ...     cache.convert("samples/hello-world.ipynb", "percent") == code
+        ...     cache.hits, cache.misses
+        True
+        (1, 1)
+        >>> print(code)
+        # %% [markdown]
+        # Hello world!
+        # ============
+        # Print `Hello world!`:
+        <BLANKLINE>
+        # %%
+        print("Hello world!")
+        <BLANKLINE>
+        # %% [markdown]
+        # Goodbye! 👋
+    """
+
+    def __init__(self, directory=None, max_bytes=512 * 2**20):
+        self.directory = Path(directory) if directory is not None else default_directory()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None     # taille du cache, connue après le premier parcours
+
+    def path(self, filename, converter, data=None):
+        r"""Returns the path of the cached conversion of a notebook file;
+        `data` is the content of the file, if it was already read.
+        """
+        version, _ = CONVERTERS[converter]
+        if data is not None:
+            digest = hashlib.sha256(data)
+        else:
+            digest = hashlib.sha256()
+            with open(filename, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(chunk)
+        return self.directory / f"{digest.hexdigest()}.{converter}.v{version}"
+
+    def convert(self, filename, converter):
+        r"""Converts a notebook file (str), from the cache if possible.
+        """
+        text = self._convert(filename, converter)
+        if self._size is None or self._size > self.max_bytes:
+            self.evict()
+        return text
+
+    def _convert(self, filename, converter):
+        # le notebook n'est lu qu'une fois: hashé puis converti depuis ces octets
+        with open(filename, "rb") as file:
+            content = file.read()
+        path = self.path(filename, converter, content)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            pass
+        else:
+            os.utime(path)       # pour l'éviction des conversions les moins utilisées
+            self.hits += 1
+            return data.decode("utf-8")
+
+        self.misses += 1
+        _, function = CONVERTERS[converter]
+        text = function(toolbox.loads_ipynb(content))
+        data = text.encode("utf-8")    # pas de traduction des fins de ligne
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with toolbox.atomic_write(path, binary=True) as file:
+            file.write(data)
+        if self._size is not None:
+            self._size += len(data)
+        return text
+
+    def evict(self):
+        r"""Removes the least recently used conversions beyond `max_bytes`.
+
+        The whole directory is scanned, so `convert` only calls it while
+        the size of the cache is unknown or beyond `max_bytes` (the sizes
+        of its own conversions are added up in the meantime).
+        """
+        entries = []
+        for path in self.directory.iterdir():
+            if path.name.endswith(".tmp"):       # écriture en cours
+                continue
+            stat = path.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._size = total
+
+    def warm(self, directory, converters=None):
+        r"""Converts all the notebooks below a directory with the given
+        converters (all of them by default), and returns the number of
+        conversions computed. The cache is evicted once, at the end.
+        """
+        misses = self.misses
+        try:
+            for filename in CorpusLoader(directory).filenames():
+                for converter in converters or CONVERTERS:
+                    try:
+                        self._convert(filename, converter)
+                    except (OSError, ValueError, KeyError) as error:
+                        print(f"{filename}: {error!r}", file=sys.stderr)
+        finally:
+            if self.directory.is_dir():
+                self.evict()
+        return self.misses - misses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("notebook", nargs="?", help="the notebook to convert")
+    parser.add_argument("--to", choices=sorted(CONVERTERS), default="percent",
+                        help="the conversion of the notebook")
+    parser.add_argument("--warm", metavar="DIRECTORY",
+                        help="convert all the notebooks below DIRECTORY into the cache")
+    parser.add_argument("--converter", action="append", choices=sorted(CONVERTERS),
+                        help="the converters used by --warm (all by default)")
+    parser.add_argument("--cache-dir", help="the cache directory")
+    parser.add_argument("--max-bytes", type=int, default=512 * 2**20,
+                        help="the maximum size of the cache")
+    args = parser.parse_args(argv)
+    if args.notebook is None and args.warm is None:
+        parser.error("a notebook or --warm is required")
+
+    cache = ConversionCache(args.cache_dir, args.max_bytes)
+    if args.warm is not None:
+        count = cache.warm(args.warm, args.converter)
+        print(f"{count} conversions added to {cache.directory}", file=sys.stderr)
+    if args.notebook is not None:
+        print(cache.convert(args.notebook, args.to))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import notebook_cache
+import notebook_v0 as toolbox
+from notebook_cache import *
+
+class ConversionCaching(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ConversionCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_conversions_are_cached(self):
+        filename = "samples/hello-world.ipynb"
+        for converter in CONVERTERS:
+            text = self.cache.convert(filename, converter)
+            self.assertEqual(text, self.cache.convert(filename, converter))
+        self.assertEqual(len(CONVERTERS), self.cache.misses)
+        self.assertEqual(len(CONVERTERS), self.cache.hits)
+        self.assertEqual(toolbox.to_starboard(filename, html=True),
+                         self.cache.convert(filename, "starboard-html"))
+
+    def test_key_is_content(self):
+        copy = os.path.join(self.directory, "copy.ipynb")
+        shutil.copyfile("samples/hello-world.ipynb", copy)
+        self.cache.convert("samples/hello-world.ipynb", "percent")
+        self.cache.convert(copy, "percent")
+        self.assertEqual(1, self.cache.hits)
+        with open(copy, "a") as file:
+            file.write("\n")
+        self.cache.convert(copy, "percent")
+        self.assertEqual(2, self.cache.misses)
+
+    def test_notebook_is_read_once(self):
+        filename = "samples/hello-world.ipynb"
+        opened = []
+        converted = []
+        percent = CONVERTERS["percent"]
+        notebook_cache.open = lambda path, *args: opened.append(path) or open(path, *args)
+        CONVERTERS["percent"] = (percent[0], lambda ipynb: converted.append(ipynb) or "")
+        try:
+            self.cache.convert(filename, "percent")
+        finally:
+            del notebook_cache.open
+            CONVERTERS["percent"] = percent
+        # le convertisseur reçoit le notebook parsé, pas le nom du fichier
+        self.assertEqual([filename], [path for path in opened if path == filename])
+        self.assertEqual([toolbox.load_ipynb(filename)], converted)
+        with open(filename, "rb") as file:
+            self.assertEqual(self.cache.path(filename, "percent"),
+                             self.cache.path(filename, "percent", file.read()))
+
+    def test_line_ends_are_kept(self):
+        filename = os.path.join(self.directory, "crlf.ipynb")
+        toolbox.save_ipynb({"cells": [{"cell_type": "markdown", "metadata": {},
+                                       "source": ["a\r\n", "b\r", "c"]}],
+                            "metadata": {}, "nbformat": 4, "nbformat_minor": 4}, filename)
+        text = self.cache.convert(filename, "percent")
+        self.assertIn("a\r\n", text)
+        self.assertEqual(text, self.cache.convert(filename, "percent"))
+        self.assertEqual(1, self.cache.hits)
+
+    def test_eviction(self):
+        self.cache.max_bytes = 0
+        self.cache.convert("samples/hello-world.ipynb", "percent")
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_directory_is_scanned_only_when_full(self):
+        scans = []
+        evict = self.cache.evict
+        self.cache.evict = lambda: scans.append(1) or evict()
+        for converter in CONVERTERS:
+            self.cache.convert("samples/hello-world.ipynb", converter)
+        self.assertEqual(1, len(scans))
+        self.cache.max_bytes = 0
+        self.cache.convert("samples/streams.ipynb", "percent")
+        self.assertEqual(2, len(scans))
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_warm_evicts_once(self):
+        scans = []
+        evict = self.cache.evict
+        self.cache.evict = lambda: scans.append(1) or evict()
+        self.cache.max_bytes = 1000
+        self.assertLess(1, self.cache.warm("samples", ["percent"]))
+        self.assertEqual(1, len(scans))
+        size = sum(os.path.getsize(os.path.join(self.directory, name))
+                   for name in os.listdir(self.directory))
+        self.assertLessEqual(size, 1000)
+
+    def test_warm(self):
+        count = self.cache.warm("samples", ["percent"])
+        self.assertEqual(count, len(os.listdir(self.directory)))
+        self.cache.convert("samples/hello-world.ipynb", "percent")
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(0, self.cache.warm("samples", ["percent"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
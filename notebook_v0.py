@@ -7,17 +7,117 @@ starter code for your evaluation assignment
 """
 
 # Python Standard Library
-import base64
+import asyncio
+import binascii
+import builtins
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
 import io
 import json
+import mmap
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
 import pprint
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import warnings
+import weakref
 from pathlib import Path
 
+try:
+    import resource     # POSIX seulement
+except ImportError:
+    resource = None
+
 # Third-Party Libraries
 import numpy as np
 import PIL.Image  # pillow
+import PIL.ImageFile
+import PIL.ImageMode
+
+try:
+    import orjson       # optionnel: un parseur JSON plus rapide
+except ImportError:
+    orjson = None
+
+import instrumentation
+from instrumentation import instrumented
+
+
+# JSON backend
+# ------------------------------------------------------------------------------
+def _orjson_loads(data):
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:  # NaN, Infinity, grands entiers: refusés par orjson
+        return json.loads(data)
+
+
+JSON_BACKENDS = {"json": json.loads}
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = _orjson_loads
+
+JSON_BACKEND = None
+_json_loads = json.loads
+
+
+def use_json_backend(name=None):
+    r"""
+    Select the JSON parser used to load notebooks, by name (see
+    `JSON_BACKENDS`): "orjson" if it is installed, or "json" (the standard
+    library). By default, the backend is given by the environment variable
+    NOTEBOOK_JSON_BACKEND, or else is the fastest one available.
 
+    An unknown or unavailable `name` raises a ValueError; an unknown or
+    unavailable NOTEBOOK_JSON_BACKEND only issues a RuntimeWarning, and
+    the fastest available backend is used instead (this is what happens
+    at import time).
 
+    Only the parsing is delegated: notebooks are always written by the
+    standard library, so that the saved files are the same whatever the
+    backend. Return the name of the selected backend.
+
+    Usage:
+
+        >>> use_json_backend("json")
+        'json'
+        >>> load_ipynb("samples/minimal.ipynb")
+        {'cells': [], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+        >>> _ = use_json_backend()
+    """
+    global JSON_BACKEND, _json_loads
+    default = "orjson" if orjson else "json"
+    if name is None:
+        name = os.environ.get("NOTEBOOK_JSON_BACKEND") or default
+        if name not in JSON_BACKENDS:
+            warnings.warn(
+                f"unknown or unavailable JSON backend in NOTEBOOK_JSON_BACKEND: {name!r},"
+                f" {default!r} is used instead", RuntimeWarning, stacklevel=2)
+            name = default
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"unknown or unavailable JSON backend: {name!r}")
+    JSON_BACKEND = name
+    _json_loads = JSON_BACKENDS[name]
+    return name
+
+
+use_json_backend()
+
+
+def _cell_count(ipynb):
+    return len(ipynb.get("cells", ()))
+
+
+@instrumented("load_ipynb", cells=_cell_count)
 def load_ipynb(filename):
     r"""
     Load a jupyter notebook .ipynb file (JSON) as a Python dict.
@@ -52,13 +152,30 @@ def load_ipynb(filename):
          'nbformat': 4,
          'nbformat_minor': 5}
     """
-    f = open(filename , "r", encoding = "utf-8")
-    data = json.load(f)
-    f.close()
-    return data
+    with open(filename, "rb") as f:
+        data = f.read()
+    instrumentation.count("load_ipynb", bytes_read=len(data))
+    return loads_ipynb(data)
+
+
+def loads_ipynb(data):
+    r"""
+    Parse a jupyter notebook from its JSON text (bytes or str) as a Python dict.
+
+    Usage:
+
+        >>> loads_ipynb(b'{"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 5}')
+        {'cells': [], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+    """
+    with instrumentation.stage("json.parse", bytes_read=len(data)):
+        return _json_loads(data)
+
+
 
+_WRITE_BUFFER_SIZE = 1 << 16
 
 
+@instrumented("save_ipynb")
 def save_ipynb(ipynb, filename):
     r"""
     Save a jupyter notebook (Python dict) as a .ipynb file (JSON)
@@ -79,9 +196,44 @@ def save_ipynb(ipynb, filename):
         True
 
     """
-    f = open(filename, "w", encoding = "utf-8")
-    json.dump(ipynb, f)
-    f.close()
+    # json.dumps (encodeur en C) est bien plus rapide que json.dump, pour le même texte
+    with instrumentation.stage("json.dump"):
+        text = json.dumps(ipynb)
+    # le texte est en ASCII (ensure_ascii): autant de caractères que d'octets
+    instrumentation.count("save_ipynb", bytes_written=len(text), cells=_cell_count(ipynb))
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+@contextlib.contextmanager
+def atomic_write(filename, encoding="utf-8", binary=False):
+    r"""
+    Open a text file (a binary file if `binary` is true) for writing,
+    atomically: the data is written (with a large buffer) into a temporary
+    file next to `filename`, which replaces `filename` only once everything
+    has been written.
+
+    Usage:
+
+        >>> with atomic_write("samples/minimal-save-load.ipynb") as file:
+        ...     file.write('{"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 5}')
+        65
+        >>> load_ipynb("samples/minimal-save-load.ipynb")
+        {'cells': [], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+    """
+    temporary = f"{filename}.{secrets.token_hex(4)}.tmp"
+    try:
+        if binary:
+            file = open(temporary, "xb", buffering=_WRITE_BUFFER_SIZE)
+        else:
+            file = open(temporary, "x", encoding=encoding, buffering=_WRITE_BUFFER_SIZE)
+        with file:
+            yield file
+        os.replace(temporary, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary)
+        raise
 
 
 def get_format_version(ipynb):
@@ -158,20 +310,619 @@ def get_cells(ipynb):
     """
     return ipynb["cells"]
 
-def to_percent(ipynb):
+
+def get_source_lines(cell):
+    r"""
+    Return the source of a cell (dict) as a new list of lines; nbformat
+    stores it either as a list of lines or as a single string.
+
+    Usage:
+
+        >>> get_source_lines({"source": ["x = 1\n", "y = 2"]})
+        ['x = 1\n', 'y = 2']
+        >>> get_source_lines({"source": "x = 1\ny = 2"})
+        ['x = 1\n', 'y = 2']
+    """
+    source = cell["source"]
+    if isinstance(source, str):
+        return source.splitlines(keepends=True)
+    return list(source)
+
+
+# Parse cache
+# ------------------------------------------------------------------------------
+# mémoire d'un notebook parsé / taille du fichier: ~5.9 mesuré pour des
+# cellules courtes (json et orjson), ~1 quand les sorties dominent
+PARSED_SIZE_FACTOR = 6
+
+
+class ParseCache:
+    r"""
+    A LRU cache of parsed jupyter notebooks (dicts), by filename.
+
+    An entry is only used while the file keeps the same modification time
+    and size (and, if `hash_content` is True, the same content hash); the
+    memory taken by an entry is estimated as `PARSED_SIZE_FACTOR` times the
+    size of its file (an upper bound for the notebooks measured), and the
+    least recently used entries are evicted beyond `max_bytes`.
+
+    The cached dicts are shared between the callers: they must not be
+    modified.
+
+    Args:
+        max_bytes (int): the maximum estimated memory of the cached notebooks
+            (the default keeps about 21 MB of notebook files).
+        hash_content (bool): whether to check the content hash of the files.
+
+    Attributes:
+        hits (int): the number of loads served from the cache.
+        misses (int): the number of loads which had to parse the file.
+        evictions (int): the number of entries evicted to make room.
+
+    Usage:
+
+        >>> cache = ParseCache(max_bytes=2**20)
+        >>> ipynb = cache.load("samples/hello-world.ipynb")
+        >>> cache.load("samples/hello-world.ipynb") is ipynb
+        True
+        >>> cache.stats()
+        {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 3834}
+    """
+
+    def __init__(self, max_bytes=128 * 2**20, hash_content=False):
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()   # chemin -> (clé, notebook, taille)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def accepts(self, filename):
+        r"""
+        Whether the notebook file is small enough to be cached.
+        """
+        return os.path.getsize(filename) * PARSED_SIZE_FACTOR <= self.max_bytes
+
+    @instrumented("ParseCache.load")
+    def load(self, filename):
+        r"""
+        Return the notebook (dict) of a .ipynb file, from the cache if it
+        is still valid, or parsed from the file (and cached) otherwise.
+        """
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        data = None
+        if self.hash_content:
+            with open(path, "rb") as file:
+                data = file.read()
+            key += (hashlib.blake2b(data).hexdigest(),)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        ipynb = load_ipynb(path) if data is None else _json_loads(data)
+        size = stat.st_size * PARSED_SIZE_FACTOR
+        with self._lock:
+            self._discard(path)
+            if size <= self.max_bytes:
+                self._entries[path] = (key, ipynb, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    self._discard(next(iter(self._entries)))
+                    self.evictions += 1
+        return ipynb
+
+    def _discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self):
+        r"""
+        Empty the cache (the counters are kept).
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        r"""
+        Return the counters and the current size of the cache, as a dict.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes}
+
+
+# le cache partagé par Notebook.from_file (v1) et NotebookLoader.load (v2)
+PARSE_CACHE = ParseCache()
+
+
+# Asynchronous I/O
+# ------------------------------------------------------------------------------
+MAX_IO_THREADS = 4      # nombre maximal de lectures/écritures simultanées
+MAX_PARSE_PROCESSES = os.cpu_count() or 1    # nombre maximal d'analyses JSON simultanées
+PARSE_IN_PROCESS_MIN_BYTES = 64 * 2**10     # en dessous, l'aller-retour coûte plus que l'analyse
+_io_executor = None
+_parse_executor = None
+_io_executor_lock = threading.Lock()
+_parse_semaphores = weakref.WeakKeyDictionary()     # boucle asyncio -> sémaphore
+
+
+async def run_in_io_thread(function, *args):
+    r"""
+    Run a blocking function (file I/O...) off the asyncio event loop, on a
+    shared pool of at most MAX_IO_THREADS threads, and return its result.
+
+    The threads share the GIL with the event loop: CPU-bound work such as
+    JSON parsing belongs to `parse_in_process` instead.
+
+    Usage:
+
+        >>> asyncio.run(run_in_io_thread(get_format_version, {"nbformat": 4, "nbformat_minor": 5}))
+        '4.5'
+    """
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = concurrent.futures.ThreadPoolExecutor(
+                MAX_IO_THREADS, thread_name_prefix="ipynb-io")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(function, *args))
+
+
+def _parse_json(data, backend):
+    return JSON_BACKENDS[backend](data)
+
+
+async def parse_in_process(data):
+    r"""
+    Parse a JSON document (bytes) with the selected backend (see
+    `use_json_backend`), on a shared pool of at most MAX_PARSE_PROCESSES
+    worker processes, so that the parsing does not hold the GIL of the
+    event loop. At most MAX_PARSE_PROCESSES documents are sent to the pool
+    at a time: the others wait, without being copied to the workers.
+
+    Usage:
+
+        >>> asyncio.run(parse_in_process(b'{"nbformat": 4}'))
+        {'nbformat': 4}
+    """
+    global _parse_executor
+    with _io_executor_lock:
+        if _parse_executor is None:
+            _parse_executor = concurrent.futures.ProcessPoolExecutor(
+                MAX_PARSE_PROCESSES, mp_context=process_context())
+    loop = asyncio.get_running_loop()
+    semaphore = _parse_semaphores.get(loop)
+    if semaphore is None:       # un sémaphore asyncio n'appartient qu'à une boucle
+        semaphore = _parse_semaphores[loop] = asyncio.Semaphore(MAX_PARSE_PROCESSES)
+    async with semaphore:
+        return await loop.run_in_executor(_parse_executor, _parse_json, data, JSON_BACKEND)
+
+
+def _read_bytes(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+async def aload_ipynb(filename):
+    r"""
+    Load a jupyter notebook .ipynb file (JSON) as a Python dict, without
+    blocking the event loop (see `load_ipynb`): the file is read on an I/O
+    thread (see `run_in_io_thread`) and parsed on a worker process (see
+    `parse_in_process`), unless it is smaller than
+    PARSE_IN_PROCESS_MIN_BYTES.
+
+    Usage:
+
+        >>> asyncio.run(aload_ipynb("samples/minimal.ipynb"))
+        {'cells': [], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+    """
+    data = await run_in_io_thread(_read_bytes, filename)
+    if len(data) < PARSE_IN_PROCESS_MIN_BYTES:
+        return _json_loads(data)
+    return await parse_in_process(data)
+
+
+async def asave_ipynb(ipynb, filename):
+    r"""
+    Save a jupyter notebook (Python dict) as a .ipynb file (JSON), without
+    blocking the event loop (see `save_ipynb`).
+
+    Usage:
+
+        >>> ipynb = {'cells': [], 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+        >>> asyncio.run(asave_ipynb(ipynb, "samples/minimal-save-load.ipynb"))
+        >>> load_ipynb("samples/minimal-save-load.ipynb") == ipynb
+        True
+    """
+    await run_in_io_thread(save_ipynb, ipynb, filename)
+
+
+# Streaming
+# ------------------------------------------------------------------------------
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_SCALAR = re.compile(rb"[^,\]} \t\n\r]+")
+_NESTING = re.compile(rb'[][{}"]')
+
+
+@contextlib.contextmanager
+def _mapped(filename):
+    r"""
+    Map a file in memory (read-only), as a bytes-like object.
+    """
+    with open(filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:  # mmap refuse les fichiers vides
+            yield b""
+        else:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                yield buf
+
+
+def _skip_whitespace(buf, pos):
+    return _WHITESPACE.match(buf, pos).end()
+
+
+def _expect(buf, pos, char):
+    if buf[pos:pos + 1] != char:
+        raise ValueError(f"invalid JSON: expecting {char.decode()!r} at byte {pos}")
+    return _skip_whitespace(buf, pos + 1)
+
+
+def _value_end(buf, pos):
+    r"""
+    Return the position just after the JSON value which starts at `pos`,
+    without decoding it.
+    """
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        match = _STRING.match(buf, pos)
+    elif first == b"{" or first == b"[":
+        depth = 0
+        while True:
+            match = _NESTING.search(buf, pos)
+            if match is None:
+                break
+            token = match.group()
+            if token == b'"':  # les accolades dans les chaînes ne comptent pas
+                match = _STRING.match(buf, match.start())
+                if match is None:
+                    break
+            elif token in (b"{", b"["):
+                depth += 1
+            else:
+                depth -= 1
+            pos = match.end()
+            if depth == 0:
+                return pos
+        match = None
+    else:
+        match = _SCALAR.match(buf, pos)
+    if match is None:
+        raise ValueError(f"invalid JSON: unterminated value at byte {pos}")
+    return match.end()
+
+
+def _iter_members(buf, pos):
+    r"""
+    Yield `(key, start, end)` for every member of the JSON object which
+    starts at `pos`; `buf[start:end]` is the (undecoded) member value.
+    """
+    pos = _expect(buf, _skip_whitespace(buf, pos), b"{")
+    if buf[pos:pos + 1] == b"}":
+        return
+    while True:
+        key_end = _value_end(buf, pos)
+        key = _json_loads(buf[pos:key_end])
+        start = _expect(buf, _skip_whitespace(buf, key_end), b":")
+        end = _value_end(buf, start)
+        yield key, start, end
+        pos = _skip_whitespace(buf, end)
+        if buf[pos:pos + 1] == b"}":
+            return
+        pos = _expect(buf, pos, b",")
+
+
+def _iter_items(buf, pos):
+    r"""
+    Yield `(start, end)` for every item of the JSON array which starts
+    at `pos`; `buf[start:end]` is the (undecoded) item.
+    """
+    pos = _expect(buf, _skip_whitespace(buf, pos), b"[")
+    if buf[pos:pos + 1] == b"]":
+        return
+    while True:
+        end = _value_end(buf, pos)
+        yield pos, end
+        pos = _skip_whitespace(buf, end)
+        if buf[pos:pos + 1] == b"]":
+            return
+        pos = _expect(buf, pos, b",")
+
+
+def iter_cells(filename, header=None):
+    r"""
+    Iterate the cells of a jupyter notebook .ipynb file, one cell (dict)
+    at a time, without loading the whole document in memory.
+
+    If `header` is a dict, the other top-level entries of the notebook
+    (metadata, nbformat, ...) are stored into it as they are met; it is
+    only complete once the iteration is over.
+
+    Usage:
+
+        >>> for cell in iter_cells("samples/hello-world.ipynb"):
+        ...     print(cell["id"], cell["cell_type"])
+        a9541506 markdown
+        b777420a code
+        a23ab5ac markdown
+
+        >>> header = {}
+        >>> list(iter_cells("samples/minimal.ipynb", header))
+        []
+        >>> header
+        {'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+    """
+    cells = 0
+    with _mapped(filename) as buf:
+        try:
+            for key, start, end in _iter_members(buf, 0):
+                if key == "cells":
+                    for cell_start, cell_end in _iter_items(buf, start):
+                        yield _json_loads(buf[cell_start:cell_end])
+                        cells += 1
+                elif header is not None:
+                    header[key] = _json_loads(buf[start:end])
+        finally:
+            instrumentation.count("iter_cells", cells=cells)
+
+
+def get_header(filename):
+    r"""
+    Return everything but the cells of a jupyter notebook .ipynb file
+    (metadata, nbformat, ...) as a dict; the cells are skipped without
+    being decoded.
+
+    Usage:
+
+        >>> get_header("samples/hello-world.ipynb")
+        {'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+    """
+    with _mapped(filename) as buf:
+        return {
+            key: _json_loads(buf[start:end])
+            for key, start, end in _iter_members(buf, 0)
+            if key != "cells"
+        }
+
+
+# index en mémoire, par nom de fichier absolu (LRU: les autres restent
+# disponibles dans leur fichier .idx)
+_INDEXES = collections.OrderedDict()
+MAX_CELL_INDEXES = 128
+_INDEXES_LOCK = threading.Lock()
+
+
+def _index_path(filename):
+    return Path(f"{filename}.idx")
+
+
+def _build_cell_index(filename, stat):
+    cells = []
+    ids = {}
+    array = None
+    with _mapped(filename) as buf:
+        for key, start, end in _iter_members(buf, 0):
+            if key != "cells":
+                continue
+            array = [start, end]
+            for position, (cell_start, cell_end) in enumerate(_iter_items(buf, start)):
+                cells.append([cell_start, cell_end - cell_start])
+                # seul l'id est décodé, le reste de la cellule est sauté
+                for cell_key, id_start, id_end in _iter_members(buf, cell_start):
+                    if cell_key == "id":
+                        ids[_json_loads(buf[id_start:id_end])] = position
+                        break
+    return {
+        "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+        "array": array, "cells": cells, "ids": ids,
+    }
+
+
+def load_cell_index(filename):
+    r"""
+    Return the index of the cells of a jupyter notebook .ipynb file,
+    as a dict with the keys:
+
+      - "cells": the byte offset and length of every cell in the file,
+      - "ids": the position of every cell, by id,
+      - "array": the byte offsets of the start and end of the cells array,
+      - "size" and "mtime_ns": the size and modification time of the file.
+
+    The index is stored in a sidecar file (`<filename>.idx`); it is built
+    on first use and rebuilt whenever the notebook size or mtime changes.
+    The `MAX_CELL_INDEXES` most recently used indexes are also kept in
+    memory.
+
+    Usage:
+
+        >>> index = load_cell_index("samples/hello-world.ipynb")
+        >>> len(index["cells"])
+        3
+        >>> index["ids"]
+        {'a9541506': 0, 'b777420a': 1, 'a23ab5ac': 2}
+    """
+    stat = os.stat(filename)
+    key = os.path.abspath(filename)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+    if index is None:
+        try:
+            with open(_index_path(filename), encoding="utf-8") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = None
+    if (index is None or "array" not in index  # ancien format d'index
+            or (index["size"], index["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns)):
+        index = _build_cell_index(filename, stat)
+        _store_cell_index(filename, index)
+    else:
+        _remember_index(key, index)
+    return index
+
+
+def _remember_index(key, index):
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index
+        _INDEXES.move_to_end(key)
+        while len(_INDEXES) > MAX_CELL_INDEXES:
+            _INDEXES.popitem(last=False)
+
+
+def _store_cell_index(filename, index):
+    _remember_index(os.path.abspath(filename), index)
+    try:
+        with open(_index_path(filename), "w", encoding="utf-8") as file:
+            json.dump(index, file)
+    except OSError:      # dossier en lecture seule: l'index reste en mémoire
+        pass
+
+
+@instrumented("get_cell")
+def get_cell(filename, key):
+    r"""
+    Return a single cell (dict) of a jupyter notebook .ipynb file, given
+    its position (int) or its id (str), without parsing the other cells.
+
+    Usage:
+
+        >>> get_cell("samples/hello-world.ipynb", "a23ab5ac")
+        {'cell_type': 'markdown', 'id': 'a23ab5ac', 'metadata': {}, 'source': ['Goodbye! 👋']}
+        >>> get_cell("samples/hello-world.ipynb", 0)["id"]
+        'a9541506'
+    """
+    index = load_cell_index(filename)
+    position = index["ids"][key] if isinstance(key, str) else key
+    offset, length = index["cells"][position]
+    with _mapped(filename) as buf:
+        return _json_loads(buf[offset:offset + length])
+
+
+def splice_cells(filename, cells, output):
+    r"""
+    Save a new version of a jupyter notebook .ipynb file into `output`,
+    with the cells given by `cells`, each one as:
+
+      - an int: the position of a cell of `filename`, copied byte for byte,
+      - a dict: a new cell,
+      - a pair `(position, changes)`: a cell of `filename`, with some keys
+        updated from the dict `changes`.
+
+    Everything but the cells is copied from `filename` as is; only the new
+    and the updated cells are decoded and encoded again. The index of the
+    cells of `output` (see `load_cell_index`) is written along with it.
+
+    Usage:
+
+        >>> splice_cells(
+        ...     "samples/hello-world.ipynb",
+        ...     [2, (0, {"source": ["Hi!"]}), {"cell_type": "markdown", "metadata": {}, "source": []}],
+        ...     "samples/hello-world-save-load.ipynb",
+        ... )
+        >>> for cell in load_ipynb("samples/hello-world-save-load.ipynb")["cells"]:
+        ...     print(cell.get("id"), cell["source"])
+        a23ab5ac ['Goodbye! 👋']
+        a9541506 ['Hi!']
+        None []
+    """
+    index = load_cell_index(filename)
+    if index["array"] is None:
+        raise ValueError(f"{filename}: no cells array")
+    spans = index["cells"]
+    start, end = index["array"]
+    ids = {position: id for id, position in index["ids"].items()}
+    new_spans = []
+    new_ids = {}
+    with atomic_write(output, binary=True) as file, \
+         _mapped(filename) as buf, memoryview(buf) as view:
+        file.write(view[:start])
+        file.write(b"[")
+        written = start + 1     # position dans output, pour son index
+        separator = b""
+        for cell in cells:
+            file.write(separator)
+            written += len(separator)
+            separator = b", "
+            if isinstance(cell, int):
+                offset, length = spans[cell]
+                file.write(view[offset:offset + length])
+                id = ids.get(cell)
+            else:
+                if isinstance(cell, tuple):
+                    position, changes = cell
+                    offset, length = spans[position]
+                    cell = _json_loads(buf[offset:offset + length])
+                    cell.update(changes)
+                data = json.dumps(cell).encode("utf-8")
+                file.write(data)
+                length = len(data)
+                id = cell.get("id")
+            if id is not None:
+                new_ids[id] = len(new_spans)
+            new_spans.append([written, length])
+            written += length
+        file.write(b"]")
+        file.write(view[end:])
+    stat = os.stat(output)
+    _store_cell_index(output, {
+        "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+        "array": [start, written + 1], "cells": new_spans, "ids": new_ids,
+    })
+
+
+def _cells_of(ipynb):
+    r"""
+    Return the cells of a notebook given as a dict or as a filename (the
+    cells are then streamed from the file); any other iterable is taken
+    as the cells themselves.
+    """
+    if isinstance(ipynb, (str, os.PathLike)):
+        return iter_cells(ipynb)
+    if isinstance(ipynb, dict):
+        return get_cells(ipynb)
+    return ipynb
+
+
+@instrumented("to_percent")
+def to_percent(ipynb, file=None):
     r"""
     Convert a ipynb notebook (dict) to a Python code in the percent format (str).
 
+    If `file` (an open text file) is given, the code is written into it
+    cell by cell instead, and nothing is returned.
+
     Usage:
 
         >>> ipynb = load_ipynb("samples/hello-world.ipynb")
-        >>> print(to_percent(ipynb)) # doctest: +NORMALIZE_WHITESPACE
+        >>> print(to_percent(ipynb))
         # %% [markdown]
         # Hello world!
         # ============
         # Print `Hello world!`:
+        <BLANKLINE>
         # %%
         print("Hello world!")
+        <BLANKLINE>
         # %% [markdown]
         # Goodbye! 👋
 
@@ -182,21 +933,58 @@ def to_percent(ipynb):
         ...     with open(notebook_file.with_suffix(".py"), "w", encoding="utf-8") as output:
         ...         print(percent_code, file=output)
     """
-    res = "# %% [markdown] \n"
-    for cell in ipynb["cells"]:
-        if cell["cell_type"] == "markdown":
-            if res == "# %% [markdown] \n":   # on voit si l'introduction pour markdown est là
-                res += "# " + "# ".join(cell["source"])
-            else:
-                res += "\n# %% [markdown]\n"
-                res += "# " + "# ".join(cell["source"])
+    return _write(iter_percent(ipynb), file, "to_percent")
+
+
+def iter_percent(ipynb):
+    r"""
+    Iterate the Python code in the percent format of a notebook (dict,
+    filename or iterable of cells), one fragment (str) per cell.
+
+    Usage:
+
+        >>> for fragment in iter_percent("samples/hello-world.ipynb"):
+        ...     print(repr(fragment))
+        '# %% [markdown]\n# Hello world!\n# ============\n# Print `Hello world!`:'
+        '\n\n# %%\nprint("Hello world!")'
+        '\n\n# %% [markdown]\n# Goodbye! 👋'
+    """
+    first = True
+    for cell in _cells_of(ipynb):
+        text = "".join(cell["source"])
+        if cell["cell_type"] == "code":
+            fragment = "# %%\n" + text
         else:
-            res += "\n# %% \n"
-            res += "# ".join(cell["source"])
-    return res
+            # le markdown (ou raw) est mis en commentaire, ligne par ligne
+            lines = ["# " + line if line else "#" for line in text.split("\n")]
+            fragment = f"# %% [{cell['cell_type']}]\n" + "\n".join(lines)
+        if first:
+            first = False
+            yield fragment
+        else:
+            yield "\n\n" + fragment
 
 
-    
+def _write(fragments, file, stage):
+    r"""
+    Write the fragments (str) into the file if there is one, or join
+    them in a single string; their size (UTF-8) is counted as the bytes
+    written by the instrumented `stage`.
+    """
+    counted = instrumentation.is_enabled()
+    if file is None:
+        text = "".join(fragments)
+        if counted:
+            instrumentation.count(stage, bytes_written=len(text.encode("utf-8")))
+        return text
+    size = 0
+    for fragment in fragments:
+        file.write(fragment)
+        if counted:
+            size += len(fragment.encode("utf-8"))
+    instrumentation.count(stage, bytes_written=size)
+    return None
+
 
 def starboard_html(code):
     return f"""
@@ -220,11 +1008,16 @@ def starboard_html(code):
 """
 
 
-def to_starboard(ipynb, html=False):
+@instrumented("to_starboard")
+def to_starboard(ipynb, html=False, file=None):
     r"""
     Convert a ipynb notebook (dict) to a Starboard notebook (str)
     or to a Starboard HTML document (str) if html is True.
 
+    If `file` (an open text file) is given, the notebook is written into
+    it instead, and nothing is returned; without html, it is written cell
+    by cell.
+
     Usage:
 
         >>> ipynb = load_ipynb("samples/hello-world.ipynb")
@@ -253,20 +1046,33 @@ def to_starboard(ipynb, html=False):
         ...         print(starboard_html, file=output)
     """
     if html:
-        return starboard_html(get_cells(ipynb))
-    else:
-        res = "# %% [markdown]\n"
-        for cell in ipynb["cells"]:
-            if cell["cell_type"] == "markdown":
-                if res == "# %% [markdown]\n":
-                    res += "".join(cell["source"])
-                else:
-                    res += "\n# %% [markdown]\n"
-                    res += "".join(cell["source"])
-            else:
-                res += "\n# %% [python]\n"
-                res += "".join(cell["source"])
-        return res
+        # le code est inclus en entier (repr) dans le document
+        return _write([starboard_html("".join(iter_starboard(ipynb)))], file, "to_starboard")
+    return _write(iter_starboard(ipynb), file, "to_starboard")
+
+
+def iter_starboard(ipynb):
+    r"""
+    Iterate the Starboard notebook of a notebook (dict, filename or
+    iterable of cells), one fragment (str) per cell.
+
+    Usage:
+
+        >>> for fragment in iter_starboard("samples/hello-world.ipynb"):
+        ...     print(repr(fragment))
+        '# %% [markdown]\nHello world!\n============\nPrint `Hello world!`:'
+        '\n# %% [python]\nprint("Hello world!")'
+        '\n# %% [markdown]\nGoodbye! 👋'
+    """
+    first = True
+    for cell in _cells_of(ipynb):
+        cell_type = "python" if cell["cell_type"] == "code" else cell["cell_type"]
+        fragment = f"# %% [{cell_type}]\n" + "".join(cell["source"])
+        if first:
+            first = False
+            yield fragment
+        else:
+            yield "\n" + fragment
 
 
 # Outputs
@@ -328,11 +1134,107 @@ def clear_outputs(ipynb):
             i["execution_count"] = None
 
 
+@instrumented("strip_outputs")
+def strip_outputs(filename):
+    r"""
+    Remove the cell outputs and reset the cells execution counts of a
+    jupyter notebook .ipynb file, in place, like `clear_outputs`.
+
+    The file is streamed: the outputs are skipped without being decoded,
+    everything else is copied byte for byte, and the new file replaces the
+    old one atomically. A file which has no outputs nor execution counts is
+    not rewritten. Return the number of bytes reclaimed.
+
+    Usage:
+
+        >>> save_ipynb(load_ipynb("samples/hello-world.ipynb"), "samples/hello-world-save-load.ipynb")
+        >>> strip_outputs("samples/hello-world-save-load.ipynb")
+        68
+        >>> ipynb = load_ipynb("samples/hello-world.ipynb")
+        >>> clear_outputs(ipynb)
+        >>> load_ipynb("samples/hello-world-save-load.ipynb") == ipynb
+        True
+        >>> strip_outputs("samples/hello-world-save-load.ipynb")
+        0
+    """
+    with _mapped(filename) as buf:
+        replacements = []   # (début, fin, nouvelle valeur)
+        for key, start, end in _iter_members(buf, 0):
+            if key != "cells":
+                continue
+            for cell_start, _ in _iter_items(buf, start):
+                is_code = False
+                spans = []
+                for cell_key, value_start, value_end in _iter_members(buf, cell_start):
+                    if cell_key == "cell_type":
+                        is_code = _json_loads(buf[value_start:value_end]) == "code"
+                    elif cell_key == "outputs" and buf[value_start:value_end] != b"[]":
+                        spans.append((value_start, value_end, b"[]"))
+                    elif cell_key == "execution_count" and buf[value_start:value_end] != b"null":
+                        spans.append((value_start, value_end, b"null"))
+                if is_code:
+                    replacements.extend(spans)
+        if not replacements:
+            return 0
 
+        reclaimed = 0
+        with atomic_write(filename, binary=True) as file, memoryview(buf) as view:
+            pos = 0
+            for start, end, value in replacements:
+                file.write(view[pos:start])
+                file.write(value)
+                reclaimed += end - start - len(value)
+                pos = end
+            file.write(view[pos:])
+    return reclaimed
+
+
+def strip_all_outputs(filenames, max_workers=None):
+    r"""
+    Strip the outputs of many .ipynb files (see `strip_outputs`), in
+    parallel on a process pool.
+
+    Return a dict with, for each file, the number of bytes reclaimed, or
+    the exception raised if it could not be stripped (the other files are
+    stripped all the same).
+
+    Args:
+        filenames (iterable): the notebook files.
+        max_workers (int): the number of worker processes (defaults to the
+            number of processors); 1 strips the files in this process.
+
+    Usage:
+
+        >>> save_ipynb(load_ipynb("samples/images.ipynb"), "samples/images-save-load.ipynb")
+        >>> strip_all_outputs(["samples/images-save-load.ipynb", "samples/missing.ipynb"])
+        {'samples/images-save-load.ipynb': 612645, 'samples/missing.ipynb': FileNotFoundError(2, 'No such file or directory')}
+    """
+    filenames = list(filenames)
+    if len(filenames) < 2 or max_workers == 1:
+        return dict(zip(filenames, map(_strip_outputs_or_error, filenames)))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers, mp_context=process_context()) as executor:
+        # beaucoup de petits fichiers: on les envoie par paquets
+        results = executor.map(_strip_outputs_or_error, filenames, chunksize=16)
+        return dict(zip(filenames, results))
+
+
+def _strip_outputs_or_error(filename):
+    try:
+        return strip_outputs(filename)
+    except (OSError, ValueError) as error:
+        return error
+
+
+
+@instrumented("get_stream")
 def get_stream(ipynb, stdout=True, stderr=False):
     r"""
     Return the text written to the standard output and/or error stream.
 
+    The notebook may also be given as a filename; its cells are then
+    streamed from the file (see `iter_cells`).
+
     Usage:
 
         >>> ipynb = load_ipynb("samples/streams.ipynb")
@@ -343,30 +1245,132 @@ def get_stream(ipynb, stdout=True, stderr=False):
         >>> print(get_stream(ipynb, stdout=True, stderr=True)) # doctest: +NORMALIZE_WHITESPACE
         👋 Hello world! 🌍
         🔥 This is fine. 🔥 (https://gunshowcomic.com/648)
+        >>> print(get_stream("samples/streams.ipynb")) # doctest: +NORMALIZE_WHITESPACE
+        👋 Hello world! 🌍
     """
-    s = ""
-    if stdout and stderr:
-        for i in ipynb["cells"]:
-            for j in i["outputs"]:
-                    s += j["text"][0]
-        return s
-    if not stdout and stderr:
-        a = ipynb["cells"][1]["outputs"]
-        for i in a:
-            s += i["text"][0]
-        return s
-    else:
-        a = ipynb["cells"][0]["outputs"]
-        for i in a:
-            s += i["text"][0]
-        return s
+    names = set()
+    if stdout:
+        names.add("stdout")
+    if stderr:
+        names.add("stderr")
+
+    s = io.StringIO()
+    for _, text in iter_stream(ipynb, names):
+        s.write(text)
+    return s.getvalue()
+
+
+def get_streams(ipynb):
+    r"""
+    Return the text written to every stream (stdout, stderr, ...) by the
+    notebook cells, as a dict indexed by stream name; the outputs are
+    walked only once.
+
+    Usage:
+
+        >>> get_streams("samples/streams.ipynb")
+        {'stdout': '👋 Hello world! 🌍\n', 'stderr': '🔥 This is fine. 🔥 (https://gunshowcomic.com/648)\n'}
+    """
+    buffers = {}
+    for name, text in iter_stream(ipynb):
+        if name not in buffers:
+            buffers[name] = io.StringIO()
+        buffers[name].write(text)
+    return {name: buffer.getvalue() for name, buffer in buffers.items()}
+
+
+def iter_stream(ipynb, names=None):
+    r"""
+    Iterate the text chunks written to the streams by the notebook cells,
+    in order, as `(name, text)` pairs.
+
+    Args:
+        ipynb (dict or str): the notebook, or its filename (its cells are
+            then streamed from the file).
+        names (collection): the names of the streams to keep (all of
+            them by default).
+
+    Usage:
+
+        >>> for name, text in iter_stream("samples/streams.ipynb", names={"stderr"}):
+        ...     print(name, text, end="")
+        stderr 🔥 This is fine. 🔥 (https://gunshowcomic.com/648)
+    """
+    for cell in _cells_of(ipynb):
+        if cell["cell_type"] == "code":
+            for output in cell["outputs"]:
+                if output["output_type"] != "stream":
+                    continue
+                name = output["name"]
+                if names is None or name in names:
+                    text = output["text"]
+                    if isinstance(text, str):   # nbformat accepte str ou liste de str
+                        yield name, text
+                    else:
+                        for chunk in text:
+                            yield name, chunk
 
 
         
-def get_exceptions(ipynb):
+# les classes d'exceptions prédéfinies, par nom
+EXCEPTION_TYPES = {
+    name: value
+    for name, value in vars(builtins).items()
+    if isinstance(value, type) and issubclass(value, BaseException)
+}
+_OTHER_EXCEPTION_TYPES = {}
+
+
+def _rebuild_exception(ename, evalue):
+    r"""
+    Build an exception from its class name and its message.
+
+    Builtin exception classes are looked up in EXCEPTION_TYPES; for other
+    names, an Exception subclass with that name is created (once).
+    """
+    cls = EXCEPTION_TYPES.get(ename)
+    if cls is None:
+        cls = _OTHER_EXCEPTION_TYPES.get(ename)
+        if cls is None:
+            cls = _OTHER_EXCEPTION_TYPES[ename] = type(ename, (Exception,), {})
+    try:
+        return cls(evalue)
+    except Exception:       # ex: UnicodeDecodeError attend 5 arguments
+        return Exception(f"{ename}: {evalue}")
+
+
+def get_stored_exceptions(ipynb):
+    r"""
+    Return the exceptions stored in the error outputs of a notebook cells,
+    without executing any code.
+
+    The notebook may be given as a dict or as a filename (its cells are
+    then streamed from the file).
+
+    Usage:
+
+        >>> for error in get_stored_exceptions("samples/errors.ipynb"):
+        ...     print(repr(error))
+        TypeError("unsupported operand type(s) for +: 'int' and 'str'")
+        Warning('🌧️  light rain')
+    """
+    errors = []
+    for cell in _cells_of(ipynb):
+        if cell["cell_type"] == "code":
+            for output in cell["outputs"]:
+                if output["output_type"] == "error":
+                    errors.append(_rebuild_exception(output["ename"], output["evalue"]))
+    return errors
+
+
+def get_exceptions(ipynb, from_outputs=False):
     r"""
     Return all exceptions raised during cell executions.
 
+    If `from_outputs` is True, the code is not executed again: the
+    exceptions are rebuilt from the error outputs stored in the notebook
+    (see `get_stored_exceptions`).
+
     Usage:
 
         >>> ipynb = load_ipynb("samples/hello-world.ipynb")
@@ -381,22 +1385,243 @@ def get_exceptions(ipynb):
         ...     print(repr(error))
         TypeError("unsupported operand type(s) for +: 'int' and 'str'")
         Warning('🌧️  light rain')
+        >>> get_exceptions(ipynb, from_outputs=True)
+        [TypeError("unsupported operand type(s) for +: 'int' and 'str'"), Warning('🌧️  light rain')]
     """
-    
-    cells = get_cells(ipynb)
+    if from_outputs:
+        return get_stored_exceptions(ipynb)
+    # le code des cellules n'est jamais exécuté dans ce processus
+    return scan_exceptions([ipynb], max_workers=1)[0]
+
+
+@instrumented("scan_exceptions")
+def scan_exceptions(notebooks, max_workers=None, timeout=None, memory_limit=None):
+    r"""
+    Execute the code cells of several notebooks (dicts or filenames) in
+    worker processes, and return the exceptions raised during the cell
+    executions, as one list per notebook (in cell order).
+
+    Each notebook runs in a fresh worker process of its own, so nothing
+    leaks from a notebook to the next; its code cells are executed one
+    after the other, in a single namespace (so that a cell still sees the
+    variables defined by the previous ones). Up to `max_workers` notebooks
+    run at the same time. On POSIX, the workers are new interpreters which
+    do not import the `__main__` module of the caller again, so scripts
+    without an `if __name__ == "__main__":` guard can call this function.
+
+    A worker which dies (`os._exit`, a crash...) or which has to be killed
+    is reported as an error of its notebook, as the last one (its next cells
+    are not executed); the other notebooks are not affected.
+
+    Args:
+        notebooks (iterable): the notebooks, as dicts or filenames.
+        max_workers (int): the number of notebooks executed at the same
+            time (defaults to the number of processors).
+        timeout (float): the maximum execution time of a cell, in seconds;
+            a cell which runs longer is interrupted and reported as a
+            TimeoutError. If the cell cannot be interrupted (C code which
+            never checks for signals, or no SIGALRM on this platform), the
+            worker is killed shortly after the timeout instead.
+        memory_limit (int): the maximum size of the address space of a
+            worker process, in bytes; allocations beyond it are reported
+            as a MemoryError (POSIX only).
+
+    Usage:
+
+        >>> errors = scan_exceptions(["samples/errors.ipynb", "samples/hello-world.ipynb"])
+        >>> [[type(error).__name__ for error in notebook] for notebook in errors]
+        [['TypeError', 'Warning'], []]
+        >>> scan_exceptions([{"cells": [{"cell_type": "code", "source": ["while True:\n", "    pass"]}]}],
+        ...                 timeout=0.1)
+        [[TimeoutError('cell execution timed out after 0.1 s')]]
+        >>> scan_exceptions([{"cells": [{"cell_type": "code", "source": ["import os; os._exit(3)"]}]}])
+        [[ChildProcessError('worker process exited with code 3')]]
+    """
+    sources = [
+        ["".join(cell["source"]) for cell in _cells_of(ipynb) if cell["cell_type"] == "code"]
+        for ipynb in notebooks
+    ]
+    if not sources:
+        return []
+    max_workers = max_workers or os.cpu_count() or 1
+    # un thread par notebook en cours surveille son processus
+    with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(sources))) as executor:
+        return list(executor.map(
+            lambda cells: _scan_in_process(cells, timeout, memory_limit), sources
+        ))
+
+
+_KILL_GRACE = 1.0     # délai (s) laissé au SIGALRM avant de tuer le worker
+
+
+def process_context():
+    r"""
+    Return the multiprocessing context of the process pools: "forkserver"
+    where it exists, since forking a process which runs threads may
+    deadlock the child, and "spawn" otherwise.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class _WorkerProcess:
+    # l'interface de multiprocessing.Process, pour un subprocess.Popen
+
+    def __init__(self, popen):
+        self.popen = popen
+
+    def kill(self):
+        self.popen.kill()
+
+    def is_alive(self):
+        return self.popen.poll() is None
+
+    def join(self):
+        self.popen.wait()
+
+    @property
+    def exitcode(self):
+        return self.popen.returncode
+
+
+# le code du worker: un interpréteur neuf, qui n'importe que ce module
+_WORKER_CODE = "import importlib, sys; importlib.import_module(sys.argv[1])._worker_main(int(sys.argv[2]))"
+
+
+def _start_worker(sources, timeout, memory_limit):
+    r"""
+    Start a worker process which executes the sources of the code cells of
+    a notebook (see `_run_cells`), and return it, with the connection on
+    which it sends the exception raised by each cell.
+
+    On POSIX, the worker is a new interpreter (started with subprocess)
+    which imports this module only: multiprocessing would import the
+    `__main__` module of the caller again, which fails in scripts without
+    an `if __name__ == "__main__":` guard.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    if os.name != "posix":      # pas de pass_fds: multiprocessing
+        process = process_context().Process(
+            target=_run_cells, args=(sources, timeout, memory_limit, sender), daemon=True
+        )
+        process.start()
+        sender.close()      # sinon, la mort du worker ne serait pas vue (EOF)
+        return process, receiver
+
+    root = Path(__file__).resolve().parents[__name__.count(".")]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(root), env.get("PYTHONPATH")]))
+    try:
+        popen = subprocess.Popen(
+            [sys.executable, "-c", _WORKER_CODE, __name__, str(sender.fileno())],
+            stdin=subprocess.PIPE, pass_fds=[sender.fileno()], env=env,
+        )
+    finally:
+        sender.close()
+    try:
+        with popen.stdin:
+            pickle.dump((sources, timeout, memory_limit), popen.stdin)
+    except BrokenPipeError:     # worker déjà mort: vu comme EOF
+        pass
+    return _WorkerProcess(popen), receiver
+
+
+def _worker_main(fd):
+    r"""
+    Run a worker started by `_start_worker`: read the arguments of
+    `_run_cells` from stdin and send the results to the connection `fd`.
+    """
+    connection = multiprocessing.connection.Connection(fd, readable=False)
+    sources, timeout, memory_limit = pickle.load(sys.stdin.buffer)
+    _run_cells(sources, timeout, memory_limit, connection)
+
+
+def _scan_in_process(sources, timeout, memory_limit):
+    r"""
+    Execute the sources of the code cells of a notebook in a new worker
+    process, and return the exceptions raised (see `scan_exceptions`).
+    """
+    process, receiver = _start_worker(sources, timeout, memory_limit)
     errors = []
-    for cell in cells:
-        if cell["cell_type"] == "code":
-            for text in cell["source"]:
-                try:
-                    exec(text)
-                except Exception as err:
-                    errors.append(err)
+    try:
+        for _ in sources:
+            wait = None if timeout is None else timeout + _KILL_GRACE
+            if not receiver.poll(wait):
+                process.kill()
+                errors.append(TimeoutError(
+                    f"cell execution timed out after {timeout} s (worker killed)"))
+                break
+            try:
+                error = receiver.recv()
+            except EOFError:
+                process.join()
+                errors.append(ChildProcessError(
+                    f"worker process exited with code {process.exitcode}"))
+                break
+            if error is not None:
+                errors.append(error)
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
     return errors
 
 
+def _limit_memory(memory_limit):
+    if memory_limit is not None and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
 
 
+def _run_cells(sources, timeout, memory_limit, connection):
+    r"""
+    Execute the sources of the code cells of a notebook (in a worker
+    process), and send the exception raised by each cell (or None) to
+    the connection.
+    """
+    _limit_memory(memory_limit)
+
+    def interrupt(signum, frame):
+        raise TimeoutError(f"cell execution timed out after {timeout} s")
+
+    use_timer = timeout is not None and hasattr(signal, "setitimer")
+    if use_timer:
+        signal.signal(signal.SIGALRM, interrupt)
+
+    namespace = {"__name__": "__main__"}
+    for source in sources:
+        error = None
+        try:
+            if use_timer:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                exec(source, namespace)
+            finally:
+                if use_timer:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except Exception as err:
+            error = _picklable(err)
+        connection.send(error)
+    connection.close()
+
+
+def _picklable(error):
+    r"""
+    Return the exception itself if it can be sent back to the calling
+    process, or a plain Exception with the same text otherwise (e.g. for
+    exception classes defined in the notebook itself).
+    """
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return Exception(f"{type(error).__name__}: {error}")
+    return error
+
+
+
+
+@instrumented("get_images")
 def get_images(ipynb):
     r"""
     Return the PNG images contained in a notebook cells outputs
@@ -419,12 +1644,162 @@ def get_images(ipynb):
                 [ 14,  13,  19]]], dtype=uint8)
     """
     
-    lst = []
-    for cell in get_cells(ipynb):
+    return [decode_png(raw) for raw in _iter_png(ipynb)]
+
+
+def _iter_png(ipynb):
+    r"""
+    Yield the (base64-encoded) PNG images of a notebook cells outputs.
+    """
+    for cell in _cells_of(ipynb):
         if cell["cell_type"] == "code":
             for i in cell["outputs"]:
-                raw = i['data'].get("image/png") # pour qu'on n'appelle pas ceux qui sont déjà en numpy array
+                raw = i.get('data', {}).get("image/png") # pour qu'on n'appelle pas ceux qui sont déjà en numpy array
                 if raw is not None:
-                    img = PIL.Image.open(io.BytesIO(base64.b64decode(raw)))
-                    lst.append(np.array(img))           
-    return lst 
\ No newline at end of file
+                    yield raw
+
+
+@instrumented("extract_images")
+def extract_images(notebooks, max_workers=None, stack=False):
+    r"""
+    Return the PNG images contained in the cells outputs of several
+    notebooks (dicts or filenames), decoded in parallel on a process pool.
+
+    The images are returned in a stable order: notebook after notebook,
+    and in the order of the cells outputs within each notebook.
+
+    Args:
+        notebooks (iterable): the notebooks, as dicts or filenames.
+        max_workers (int): the number of worker processes (defaults to the
+            number of processors); 1 decodes the images in this process.
+        stack (bool): if True, return a single (preallocated) NumPy array
+            of shape (n, height, width, channels) instead of a list; all
+            the images must then have the same shape.
+
+    Usage:
+
+        >>> images = extract_images(["samples/images.ipynb", "samples/hello-world.ipynb"])
+        >>> [np.shape(image) for image in images]
+        [(600, 512, 3)]
+        >>> ipynb = load_ipynb("samples/images.ipynb")
+        >>> images = extract_images([ipynb, "samples/images.ipynb"], stack=True)
+        >>> images.shape
+        (2, 600, 512, 3)
+    """
+    payloads = [raw for ipynb in notebooks for raw in _iter_png(ipynb)]
+    if len(payloads) < 2 or max_workers == 1:
+        if stack and payloads:
+            # les images suivantes sont décodées directement dans le tableau
+            first = decode_png(payloads[0], readonly=True)   # copiée dans res
+            res = np.empty((len(payloads),) + first.shape, dtype=first.dtype)
+            res[0] = first
+            for position, raw in enumerate(payloads[1:], start=1):
+                decode_png(raw, out=res[position])
+            return res
+        # avec stack, les images sont copiées dans le tableau final
+        decode = functools.partial(decode_png, readonly=stack)
+        return _collect_images(map(decode, payloads), len(payloads), stack)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers, mp_context=process_context()) as executor:
+        # map garde l'ordre des images, quel que soit l'ordre de décodage
+        # les tableaux renvoyés par les workers sont recopiés (et donc modifiables)
+        images = executor.map(functools.partial(decode_png, readonly=True), payloads)
+        return _collect_images(images, len(payloads), stack)
+
+
+def _collect_images(images, count, stack):
+    if not stack:
+        return list(images)
+    res = None
+    for position, image in enumerate(images):
+        if res is None:
+            res = np.empty((count,) + image.shape, dtype=image.dtype)
+        elif image.shape != res.shape[1:]:
+            raise ValueError(
+                f"cannot stack images of shapes {res.shape[1:]} and {image.shape}"
+            )
+        res[position] = image
+    if res is None:
+        return np.empty((0,), dtype=np.uint8)
+    return res
+
+
+def decode_png(data, out=None, readonly=False):
+    r"""
+    Decode a base64-encoded PNG image (as found in the "image/png" data
+    of a cell output) into a (writable) NumPy array.
+
+    The decoded PNG bytes are handed to PIL without being copied, and the
+    pixels decoded by PIL are written chunk by chunk into the returned
+    array, instead of being joined into a `bytes` object first (which
+    `np.asarray(img)` does) and copied again to get a writable array. The
+    pixels may also be written into a preallocated array `out` of the
+    right shape, which is then returned; this lets callers reuse the same
+    memory for many images. With `readonly=True`, the returned array is
+    marked read-only (for arrays shared by several callers).
+
+    Usage:
+
+        >>> raw = load_ipynb("samples/images.ipynb")["cells"][3]["outputs"][0]["data"]["image/png"]
+        >>> decode_png(raw).shape
+        (600, 512, 3)
+        >>> decode_png(raw, readonly=True).flags.writeable
+        False
+        >>> out = np.zeros((600, 512, 3), dtype=np.uint8)
+        >>> decode_png(raw, out=out) is out
+        True
+        >>> int(out[0, 0, 2])
+        77
+    """
+    with instrumentation.stage("base64.decode", bytes_read=len(data)):
+        png = binascii.a2b_base64(data)
+    with instrumentation.stage("png.decode", bytes_read=len(png)):
+        img = PIL.Image.open(io.BytesIO(png))   # BytesIO partage les octets
+        img.load()
+        if img.mode == "1":
+            # bits -> octets: on laisse PIL faire la conversion
+            pixels = np.asarray(img)
+            if out is None:
+                return pixels if readonly else pixels.copy()
+            _check_shape(pixels.shape, out)
+            np.copyto(out, pixels)
+            return out
+        mode = PIL.ImageMode.getmode(img.mode)
+        shape = (img.height, img.width) + ((len(mode.bands),) if len(mode.bands) > 1 else ())
+        if out is None:
+            out = np.empty(shape, dtype=mode.typestr)
+        else:
+            _check_shape(shape, out)
+        if out.flags.c_contiguous and out.dtype == np.dtype(mode.typestr):
+            _read_pixels(img, out)
+        else:
+            np.copyto(out, np.asarray(img))
+    if readonly:
+        out.flags.writeable = False
+    return out
+
+
+def _check_shape(shape, out):
+    if out.shape != tuple(shape):
+        raise ValueError(f"cannot decode an image of shape {tuple(shape)} into {out.shape}")
+
+
+def _read_pixels(img, out):
+    r"""
+    Write the pixels of a loaded PIL image into a C-contiguous array, as
+    `img.tobytes()` would return them but without the intermediate bytes.
+    """
+    # le codeur "raw" est celui qu'utilise Image.tobytes
+    encoder = PIL.Image._getencoder(img.mode, "raw", img.mode)
+    encoder.setimage(img.im, (0, 0) + img.size)
+    bufsize = max(PIL.ImageFile.MAXBLOCK, img.width * 4)
+    view = memoryview(out.reshape(-1).view(np.uint8))
+    offset = 0
+    while True:
+        _, errcode, chunk = encoder.encode(bufsize)
+        view[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+        if errcode:
+            break
+    if errcode < 0:
+        raise RuntimeError(f"encoder error {errcode} while reading the pixels")
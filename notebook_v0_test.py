@@ -1,11 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
+import base64
+import io
+import json
 import os
+import signal
+import subprocess
+import sys
 import unittest
 import numpy as np
+import PIL.Image
 
+import notebook_v0
 from notebook_v0 import *
+from notebook_v0 import resource
 
 def strip_last_lines(s):
     while s and s.endswith("\n"):
@@ -313,6 +323,358 @@ class Question8(unittest.TestCase):
         self.assertEqual((600, 512, 3), grace_hopper_image.shape)
         self.assertEqual(np.uint8, grace_hopper_image.dtype)
 
+class IterCells(unittest.TestCase):
+    def test_iter_cells_matches_load_ipynb(self):
+        for filename in ["samples/minimal.ipynb", "samples/hello-world.ipynb",
+                         "samples/metadata.ipynb", "samples/images.ipynb"]:
+            header = {}
+            cells = list(iter_cells(filename, header))
+            ipynb = load_ipynb(filename)
+            self.assertEqual(ipynb["cells"], cells)
+            header["cells"] = cells
+            self.assertEqual(ipynb, header)
+
+    def test_iter_cells_is_lazy(self):
+        cells = iter_cells("samples/hello-world.ipynb")
+        self.assertEqual("a9541506", next(cells)["id"])
+        cells.close()
+
+    def test_get_stream_from_file(self):
+        self.assertEqual(
+            "🔥 This is fine. 🔥 (https://gunshowcomic.com/648)\n",
+            get_stream("samples/streams.ipynb", stdout=False, stderr=True),
+        )
+
+class Streams(unittest.TestCase):
+    def test_get_streams(self):
+        ipynb = load_ipynb("samples/streams.ipynb")
+        streams = get_streams(ipynb)
+        self.assertEqual(get_stream(ipynb), streams["stdout"])
+        self.assertEqual(get_stream(ipynb, stdout=False, stderr=True), streams["stderr"])
+
+    def test_iter_stream_joins_every_chunk(self):
+        ipynb = {"cells": [
+            {"cell_type": "markdown", "source": []},
+            {"cell_type": "code", "outputs": [
+                {"output_type": "stream", "name": "stdout", "text": ["a\n", "b\n"]},
+                {"output_type": "stream", "name": "stderr", "text": "c\n"},
+                {"output_type": "stream", "name": "stdout", "text": ["d\n"]},
+            ]},
+        ]}
+        self.assertEqual(
+            [("stdout", "a\n"), ("stdout", "b\n"), ("stderr", "c\n"), ("stdout", "d\n")],
+            list(iter_stream(ipynb)),
+        )
+        self.assertEqual("a\nb\nd\n", get_stream(ipynb))
+        self.assertEqual("a\nb\nc\nd\n", get_stream(ipynb, stderr=True))
+
+class StreamingWriters(unittest.TestCase):
+    def test_to_percent_into_file(self):
+        ipynb = load_ipynb("samples/hello-world.ipynb")
+        output = io.StringIO()
+        self.assertIsNone(to_percent(ipynb, file=output))
+        self.assertEqual(to_percent(ipynb), output.getvalue())
+        self.assertEqual(to_percent(ipynb), to_percent("samples/hello-world.ipynb"))
+
+    def test_to_starboard_into_file(self):
+        ipynb = load_ipynb("samples/hello-world.ipynb")
+        for html in (False, True):
+            output = io.StringIO()
+            to_starboard(ipynb, html=html, file=output)
+            self.assertEqual(to_starboard(ipynb, html=html), output.getvalue())
+
+    def test_first_cell_is_code(self):
+        ipynb = {"cells": [
+            {"cell_type": "code", "source": ["x = 1\n", "y = 2"]},
+            {"cell_type": "markdown", "source": ["# Title\n", "\n", "text"]},
+        ]}
+        self.assertEqual(
+            "# %%\nx = 1\ny = 2\n\n# %% [markdown]\n# # Title\n#\n# text",
+            to_percent(ipynb),
+        )
+        self.assertEqual(
+            "# %% [python]\nx = 1\ny = 2\n# %% [markdown]\n# Title\n\ntext",
+            to_starboard(ipynb),
+        )
+
+class CellIndex(unittest.TestCase):
+    def test_get_cell_by_position_and_id(self):
+        cells = load_ipynb("samples/images.ipynb")["cells"]
+        for position, cell in enumerate(cells):
+            self.assertEqual(cell, get_cell("samples/images.ipynb", position))
+        self.assertEqual("a23ab5ac", get_cell("samples/hello-world.ipynb", "a23ab5ac")["id"])
+
+    def test_stale_index_is_rebuilt(self):
+        ipynb = load_ipynb("samples/hello-world.ipynb")
+        save_ipynb(ipynb, "samples/index-save-load.ipynb")
+        try:
+            self.assertEqual(3, len(load_cell_index("samples/index-save-load.ipynb")["cells"]))
+            ipynb["cells"].pop(0)
+            save_ipynb(ipynb, "samples/index-save-load.ipynb")
+            os.utime("samples/index-save-load.ipynb", ns=(0, 0))
+            index = load_cell_index("samples/index-save-load.ipynb")
+            self.assertEqual(2, len(index["cells"]))
+            self.assertEqual(
+                ipynb["cells"][0], get_cell("samples/index-save-load.ipynb", "b777420a")
+            )
+        finally:
+            os.remove("samples/index-save-load.ipynb")
+            os.remove("samples/index-save-load.ipynb.idx")
+
+    def test_indexes_in_memory_are_bounded(self):
+        filenames = ["samples/hello-world.ipynb", "samples/images.ipynb", "samples/metadata.ipynb"]
+        limit = notebook_v0.MAX_CELL_INDEXES
+        notebook_v0.MAX_CELL_INDEXES = 2
+        try:
+            for filename in filenames:
+                load_cell_index(filename)
+            self.assertEqual([os.path.abspath(filename) for filename in filenames[1:]],
+                             list(notebook_v0._INDEXES)[-2:])
+            self.assertEqual(2, len(notebook_v0._INDEXES))
+            # l'index évincé est relu depuis son fichier .idx
+            self.assertEqual(3, len(load_cell_index(filenames[0])["cells"]))
+        finally:
+            notebook_v0.MAX_CELL_INDEXES = limit
+
+class ScanExceptions(unittest.TestCase):
+    def test_scan_exceptions_in_order(self):
+        errors = scan_exceptions(
+            ["samples/errors.ipynb", "samples/hello-world.ipynb", "samples/errors.ipynb"],
+            max_workers=2,
+        )
+        self.assertEqual(3, len(errors))
+        self.assertEqual([], errors[1])
+        for notebook_errors in (errors[0], errors[2]):
+            self.assertEqual(["TypeError", "Warning"],
+                             [type(error).__name__ for error in notebook_errors])
+
+    def test_cells_share_their_namespace(self):
+        ipynb = {"cells": [
+            {"cell_type": "code", "source": ["x = 1"]},
+            {"cell_type": "code", "source": ["assert x == 2, x"]},
+        ]}
+        self.assertEqual("AssertionError(1)", repr(scan_exceptions([ipynb])[0][0]))
+
+    @unittest.skipUnless(os.name == "posix", "the workers use multiprocessing elsewhere")
+    def test_script_without_main_guard(self):
+        script = "from notebook_v0 import *\nprint(get_exceptions(load_ipynb('samples/errors.ipynb')))\n"
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+        self.assertEqual("", result.stderr)
+        self.assertEqual("[TypeError(\"unsupported operand type(s) for +: 'int' and 'str'\"),"
+                         " Warning('🌧️  light rain')]\n", result.stdout)
+
+    def test_notebooks_are_isolated(self):
+        broken = {"cells": [{"cell_type": "code", "source": ["import builtins\n", "builtins.print = None"]}]}
+        printing = {"cells": [{"cell_type": "code", "source": ["print('ok')"]}]}
+        self.assertEqual([[], []], scan_exceptions([broken, printing], max_workers=1))
+
+    def test_dead_worker_is_reported(self):
+        dying = {"cells": [
+            {"cell_type": "code", "source": ["1 / 0"]},
+            {"cell_type": "code", "source": ["import os\n", "os._exit(1)"]},
+            {"cell_type": "code", "source": ["never_run"]},
+        ]}
+        errors = scan_exceptions([dying, "samples/errors.ipynb"], max_workers=2)
+        self.assertEqual(["ZeroDivisionError", "ChildProcessError"],
+                         [type(error).__name__ for error in errors[0]])
+        self.assertEqual(2, len(errors[1]))
+
+    @unittest.skipUnless(hasattr(signal, "pthread_sigmask"), "POSIX only")
+    def test_uninterruptible_cell_is_killed(self):
+        ipynb = {"cells": [{"cell_type": "code", "source": [
+            "import signal\n",
+            "signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})\n",
+            "while True:\n",
+            "    pass",
+        ]}]}
+        errors = scan_exceptions([ipynb], timeout=0.1)[0]
+        self.assertEqual(1, len(errors))
+        self.assertIsInstance(errors[0], TimeoutError)
+
+    @unittest.skipUnless(getattr(resource, "RLIMIT_AS", None) is not None,
+                         "no address space limit on this platform")
+    def test_timeout_and_memory_limit(self):
+        ipynb = {"cells": [
+            {"cell_type": "code", "source": ["while True:\n", "    pass"]},
+            {"cell_type": "code", "source": ["data = bytearray(8 * 2 ** 30)"]},
+        ]}
+        errors = scan_exceptions([ipynb], timeout=0.1, memory_limit=4 * 2 ** 30)[0]
+        self.assertIsInstance(errors[0], TimeoutError)
+        self.assertIsInstance(errors[1], MemoryError)
+
+class StoredExceptions(unittest.TestCase):
+    def test_stored_exceptions(self):
+        ipynb = load_ipynb("samples/errors.ipynb")
+        self.assertEqual(
+            [repr(error) for error in get_exceptions(ipynb)],
+            [repr(error) for error in get_exceptions(ipynb, from_outputs=True)],
+        )
+        self.assertEqual([], get_stored_exceptions("samples/hello-world.ipynb"))
+
+    def test_unknown_exception_type(self):
+        ipynb = {"cells": [{"cell_type": "code", "outputs": [
+            {"output_type": "error", "ename": "LinAlgError", "evalue": "Singular matrix"},
+            {"output_type": "error", "ename": "LinAlgError", "evalue": "Singular matrix"},
+        ]}]}
+        first, second = get_stored_exceptions(ipynb)
+        self.assertIsInstance(first, Exception)
+        self.assertEqual("LinAlgError('Singular matrix')", repr(first))
+        self.assertIs(type(first), type(second))
+
+class ExtractImages(unittest.TestCase):
+    def test_extract_images_in_order(self):
+        notebooks = ["samples/images.ipynb", "samples/hello-world.ipynb",
+                     load_ipynb("samples/images.ipynb")]
+        images = extract_images(notebooks, max_workers=2)
+        self.assertEqual(2, len(images))
+        expected = get_images(load_ipynb("samples/images.ipynb"))[0]
+        for image in images:
+            np.testing.assert_array_equal(expected, image)
+
+    def test_extract_images_stacked(self):
+        images = extract_images(["samples/images.ipynb"] * 3, stack=True)
+        self.assertEqual((3, 600, 512, 3), images.shape)
+        self.assertEqual(np.uint8, images.dtype)
+
+    def test_decode_png_into_preallocated_array(self):
+        raw = load_ipynb("samples/images.ipynb")["cells"][3]["outputs"][0]["data"]["image/png"]
+        image = decode_png(raw)
+        self.assertTrue(image.flags.writeable)
+        self.assertFalse(decode_png(raw, readonly=True).flags.writeable)
+        out = np.zeros((600, 512, 3), dtype=np.uint8)
+        self.assertIs(out, decode_png(raw, out=out))
+        np.testing.assert_array_equal(image, out)
+        with self.assertRaises(ValueError):
+            decode_png(raw, out=np.zeros((10, 10, 3), dtype=np.uint8))
+
+    def test_decode_png_modes(self):
+        pixels = np.arange(7 * 5 * 3, dtype=np.uint8).reshape((7, 5, 3))
+        for mode in ["RGBA", "L", "P", "I;16", "1"]:
+            file = io.BytesIO()
+            PIL.Image.fromarray(pixels).convert(mode).save(file, "PNG")
+            expected = np.asarray(PIL.Image.open(io.BytesIO(file.getvalue())))
+            raw = base64.b64encode(file.getvalue()).decode("ascii")
+            np.testing.assert_array_equal(expected, decode_png(raw))
+            self.assertEqual(expected.dtype, decode_png(raw).dtype)
+
+    def test_images_are_writable(self):
+        images = get_images(load_ipynb("samples/images.ipynb"))
+        images[0][0, 0, 0] = 1
+        self.assertEqual(1, images[0][0, 0, 0])
+        for image in extract_images(["samples/images.ipynb"] * 2):
+            self.assertTrue(image.flags.writeable)
+
+    def test_extract_no_images(self):
+        self.assertEqual([], extract_images(["samples/hello-world.ipynb"]))
+
+class AsyncIO(unittest.TestCase):
+    def test_aload_ipynb(self):
+        async def load_all(filenames):
+            return await asyncio.gather(*(aload_ipynb(filename) for filename in filenames))
+
+        filenames = ["samples/hello-world.ipynb", "samples/images.ipynb"] * 5
+        self.assertEqual([load_ipynb(filename) for filename in filenames],
+                         asyncio.run(load_all(filenames)))
+
+    def test_large_notebooks_are_parsed_in_processes(self):
+        async def load_all(filenames):
+            return await asyncio.gather(*(aload_ipynb(filename) for filename in filenames))
+
+        filenames = ["samples/hello-world.ipynb", "samples/minimal.ipynb"] * 3
+        threshold = notebook_v0.PARSE_IN_PROCESS_MIN_BYTES
+        notebook_v0.PARSE_IN_PROCESS_MIN_BYTES = 0
+        try:
+            loaded = asyncio.run(load_all(filenames))
+        finally:
+            notebook_v0.PARSE_IN_PROCESS_MIN_BYTES = threshold
+        self.assertEqual([load_ipynb(filename) for filename in filenames], loaded)
+        self.assertIsNotNone(notebook_v0._parse_executor)
+
+    def test_asave_ipynb(self):
+        ipynb = load_ipynb("samples/hello-world.ipynb")
+        asyncio.run(asave_ipynb(ipynb, "samples/hello-world-save-load.ipynb"))
+        try:
+            self.assertEqual(ipynb, load_ipynb("samples/hello-world-save-load.ipynb"))
+        finally:
+            os.remove("samples/hello-world-save-load.ipynb")
+
+class JsonBackends(unittest.TestCase):
+    def tearDown(self):
+        use_json_backend()
+        if os.path.exists("samples/backend-save-load.ipynb"):
+            os.remove("samples/backend-save-load.ipynb")
+
+    def test_backends_agree(self):
+        loaded = []
+        for name in JSON_BACKENDS:
+            self.assertEqual(name, use_json_backend(name))
+            loaded.append((load_ipynb("samples/images.ipynb"),
+                           list(iter_cells("samples/hello-world.ipynb"))))
+        for other in loaded[1:]:
+            self.assertEqual(loaded[0], other)
+        self.assertRaises(ValueError, use_json_backend, "nope")
+
+    def test_unknown_backend_in_environment(self):
+        os.environ["NOTEBOOK_JSON_BACKEND"] = "nope"
+        try:
+            with self.assertWarns(RuntimeWarning):
+                name = use_json_backend()
+            self.assertIn(name, JSON_BACKENDS)
+            # à l'import, seulement un avertissement
+            result = subprocess.run([sys.executable, "-c", "import notebook_v0"],
+                                    capture_output=True, text=True)
+            self.assertEqual(0, result.returncode)
+            self.assertIn("NOTEBOOK_JSON_BACKEND", result.stderr)
+        finally:
+            del os.environ["NOTEBOOK_JSON_BACKEND"]
+
+    def test_non_standard_json(self):
+        with open("samples/backend-save-load.ipynb", "w", encoding="utf-8") as file:
+            file.write('{"cells": [], "metadata": {"x": NaN, "n": 123456789012345678901234567890}}')
+        for name in JSON_BACKENDS:
+            use_json_backend(name)
+            metadata = load_ipynb("samples/backend-save-load.ipynb")["metadata"]
+            self.assertEqual(123456789012345678901234567890, metadata["n"])
+
+    def test_saved_text_is_stdlib_json(self):
+        ipynb = load_ipynb("samples/images.ipynb")
+        save_ipynb(ipynb, "samples/backend-save-load.ipynb")
+        with open("samples/backend-save-load.ipynb", encoding="utf-8") as file:
+            self.assertEqual(json.dumps(ipynb), file.read())
+
+class StripOutputs(unittest.TestCase):
+    filenames = ["samples/strip-%d-save-load.ipynb" % i for i in range(3)]
+
+    def setUp(self):
+        for filename, sample in zip(self.filenames, ["images", "errors", "hello-world"]):
+            save_ipynb(load_ipynb(f"samples/{sample}.ipynb"), filename)
+
+    def tearDown(self):
+        for filename in self.filenames:
+            os.remove(filename)
+
+    def test_same_as_clear_outputs(self):
+        expected = []
+        for filename in self.filenames:
+            ipynb = load_ipynb(filename)
+            clear_outputs(ipynb)
+            expected.append(ipynb)
+        sizes = [os.path.getsize(filename) for filename in self.filenames]
+        reclaimed = strip_all_outputs(self.filenames, max_workers=2)
+        for filename, ipynb, size in zip(self.filenames, expected, sizes):
+            self.assertEqual(ipynb, load_ipynb(filename))
+            self.assertEqual(size - os.path.getsize(filename), reclaimed[filename])
+            self.assertGreater(reclaimed[filename], 0)
+        self.assertEqual({filename: 0 for filename in self.filenames},
+                         strip_all_outputs(self.filenames, max_workers=1))
+
+    def test_errors_are_reported(self):
+        with open(self.filenames[0], "w", encoding="utf-8") as file:
+            file.write('{"cells": [')
+        reclaimed = strip_all_outputs(self.filenames[:2], max_workers=1)
+        self.assertIsInstance(reclaimed[self.filenames[0]], ValueError)
+        self.assertGreater(reclaimed[self.filenames[1]], 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -7,20 +7,118 @@ an object-oriented version of the notebook toolbox
 
 # Python Standard Library
 import base64
+import bisect
+import functools
 import io
 import json
+import os
 import pprint
 from pathlib import Path
 import notebook_v0 as toolbox         # pour accéder aux fonctions déjà définies dans notebook v0
+from instrumentation import instrumented
 
 # Third-Party Libraries
 import numpy as np
 import PIL.Image  # pillow
 
 class Cell:         # On a été obligé de créer cette classe car le test voit si CodeCell et MarkdownCell sont chacun un type de Cell
+    __slots__ = ("id", "_source", "position", "_dirty", "_ipynb")     # pas de __dict__ par cellule
+
+    def __init__(self, ipynb):
+        self.id = ipynb.get("id")   # les ids sont optionnels avant nbformat 4.5
+        self._source = ipynb["source"]      # partagée jusqu'au premier accès (voir source)
+        self.position = None
+        self._dirty = False
+        self._ipynb = ipynb     # état chargé (métadonnées...): pour Notebook.save
+
+    @property
+    def source(self):
+        r"""The source of the cell, as a list of str.
+
+        The loaded dict may be shared (see `toolbox.PARSE_CACHE`): its
+        source is only copied on first access, so that the cells which are
+        never looked at cost no copy.
+        """
+        source = self._source
+        if source is self._ipynb["source"]:
+            source = self._source = toolbox.get_source_lines(self._ipynb)
+        return source
+
+    @source.setter
+    def source(self, source):
+        self._source = source
+
+    @property
+    def dirty(self):
+        r"""Whether the cell differs from the cell it was loaded from (or
+        last saved as), or was marked as dirty with `cell.dirty = True`.
+        """
+        return self._dirty or self._changed()
+
+    @dirty.setter
+    def dirty(self, value):
+        self._dirty = value
+
+    def _changed(self):
+        # comparaison avec l'état chargé: rien à suivre pendant le chargement
+        original = self._ipynb
+        source = self._source
+        return self.id != original.get("id") or (
+            source is not original["source"] and source != toolbox.get_source_lines(original))
+
+class Output:
+    r"""An output of a code cell, decoded lazily.
+
+    The output is kept as it is stored in the notebook; its text and its
+    image are only decoded on first access, and then cached.
+
+    Args:
+        ipynb (dict): a dictionary representing the output in a Jupyter Notebook.
+
+    Attributes:
+        output_type (str): the type of output ("stream", "execute_result", ...).
+        ipynb (dict): the raw output.
+
+    Usage:
+
+        >>> output = Output({
+        ...     "name": "stdout",
+        ...     "output_type": "stream",
+        ...     "text": ["Hello ", "world!\n"]
+        ... })
+        >>> output.output_type
+        'stream'
+        >>> output.text
+        'Hello world!\n'
+        >>> output.image is None
+        True
+    """
+
     def __init__(self, ipynb):
-        self.id = ipynb["id"]
-        self.source = ipynb["source"]
+        self.ipynb = ipynb
+        self.output_type = ipynb["output_type"]
+
+    @functools.cached_property
+    def text(self):
+        r"""The text of the output (str), or None if it has no text.
+        """
+        if "text" in self.ipynb:      # les streams
+            return "".join(self.ipynb["text"])
+        data = self.ipynb.get("data", {})
+        if "text/plain" in data:
+            return "".join(data["text/plain"])
+        return None
+
+    @functools.cached_property
+    def image(self):
+        r"""The PNG image of the output (read-only NumPy array), or None if it
+        has no image.
+        """
+        raw = self.ipynb.get("data", {}).get("image/png")
+        if raw is None:
+            return None
+        return toolbox.decode_png(raw, readonly=True)   # mis en cache: partagé, donc en lecture seule
+
 
 class CodeCell(Cell):
     r"""A Cell of Python code in a Jupyter notebook.
@@ -32,6 +130,7 @@ class CodeCell(Cell):
         id (int): the cell's id.
         source (list): the cell's source code, as a list of str.
         execution_count (int): number of times the cell has been executed.
+        outputs (list): the cell's outputs, as a list of Output (decoded lazily).
 
     Usage:
 
@@ -47,13 +146,26 @@ class CodeCell(Cell):
         1
         >>> code_cell.source
         ['print("Hello world!")']
+        >>> code_cell.outputs
+        []
     """
 
+    __slots__ = ("execution_count", "outputs")
+    cell_type = "code"
+
     def __init__(self, ipynb):
-        self.id = ipynb["id"]
-        self.cell_type = ipynb["cell_type"]
+        self.id = ipynb.get("id")
         self.execution_count = ipynb["execution_count"]
-        self.source = ipynb["source"]
+        self._source = ipynb["source"]
+        self.outputs = [Output(output) for output in ipynb.get("outputs", [])]
+        self.position = None
+        self._dirty = False
+        self._ipynb = ipynb
+
+    def _changed(self):
+        original = self._ipynb
+        return (super()._changed() or self.execution_count != original.get("execution_count")
+                or [output.ipynb for output in self.outputs] != original.get("outputs", []))
 
 class MarkdownCell(Cell):
     r"""A Cell of Markdown markup in a Jupyter notebook.
@@ -82,10 +194,15 @@ class MarkdownCell(Cell):
         ['Hello world!\n', '============\n', 'Print `Hello world!`:']
     """
 
+    __slots__ = ()
+    cell_type = "markdown"
+
     def __init__(self, ipynb):
-        self.cell_type = ipynb["cell_type"]
-        self.id = ipynb["id"]
-        self.source = ipynb["source"]
+        self.id = ipynb.get("id")
+        self._source = ipynb["source"]
+        self.position = None
+        self._dirty = False
+        self._ipynb = ipynb
 
 class Notebook:
     r"""A Jupyter Notebook.
@@ -96,6 +213,8 @@ class Notebook:
     Attributes:
         version (str): the version of the notebook format.
         cells (list): a list of cells (either CodeCell or MarkdownCell).
+        filename (str): the file the notebook was loaded from (None if it
+            was not loaded with `from_file`).
 
     Usage:
 
@@ -120,27 +239,200 @@ class Notebook:
         self.version = toolbox.get_format_version(ipynb)
         
         cells = []
-        for i in toolbox.get_cells(ipynb):
-            if i["cell_type"] == "code":
-                cells.append(CodeCell(i)) 
-            elif i["cell_type"] == "markdown":
-                cells.append(MarkdownCell(i))
+        others = []
+        for position, i in enumerate(toolbox.get_cells(ipynb)):
+            cell = Notebook.make_cell(i)
+            if cell is not None:
+                cell.position = position    # position dans le fichier, pour Notebook.save
+                cells.append(cell)
+            else:
+                others.append(position)     # cellules brutes...: gardées par Notebook.save
         self.cells = cells
+        self._others = others
+        self.filename = None
+        self._stat = None
+        self._header = {key: value for key, value in ipynb.items() if key != "cells"}
+        self._raw_cells = toolbox.get_cells(ipynb)   # les cellules du fichier, par position
         
+    @staticmethod
+    def make_cell(ipynb):
+        r"""Builds a CodeCell or a MarkdownCell from its dictionary
+        (None for the other cell types).
+        """
+        if ipynb["cell_type"] == "code":
+            return CodeCell(ipynb)
+        elif ipynb["cell_type"] == "markdown":
+            return MarkdownCell(ipynb)
+        return None
 
-    
     @staticmethod
+    def cell_from_file(filename, key):
+        r"""Loads a single cell from an .ipynb file, given its position (int)
+        or its id (str).
+
+        Only this cell is read and parsed, thanks to an offset index of the
+        file cells (see `toolbox.load_cell_index`).
+
+        Usage:
 
+            >>> cell = Notebook.cell_from_file("samples/hello-world.ipynb", "b777420a")
+            >>> isinstance(cell, CodeCell)
+            True
+            >>> cell.source
+            ['print("Hello world!")']
+            >>> Notebook.cell_from_file("samples/hello-world.ipynb", 2).id
+            'a23ab5ac'
+        """
+        return Notebook.make_cell(toolbox.get_cell(filename, key))
+
+    @staticmethod
+    @instrumented("Notebook.from_file", cells=lambda nb: len(nb.cells))
     def from_file(filename):
         r"""Loads a notebook from an .ipynb file.
 
+        The file is parsed only once while it is unchanged: the parsed
+        notebook is kept in the shared cache `toolbox.PARSE_CACHE`.
+
         Usage:
 
             >>> nb = Notebook.from_file("samples/minimal.ipynb")
             >>> nb.version
             '4.5'
         """
-        return Notebook(toolbox.load_ipynb(filename))
+        stat = os.stat(filename)
+        nb = Notebook(toolbox.PARSE_CACHE.load(filename))
+        nb.filename = filename
+        nb._stat = (stat.st_size, stat.st_mtime_ns)
+        return nb
+
+    @staticmethod
+    def stream(filename):
+        r"""Opens a notebook .ipynb file whose cells are streamed from the
+        file, one at a time, each time the notebook is iterated (see
+        `StreamedNotebook`).
+
+        Usage:
+
+            >>> nb = Notebook.stream("samples/hello-world.ipynb")
+            >>> nb.version
+            '4.5'
+            >>> [cell.id for cell in nb]
+            ['a9541506', 'b777420a', 'a23ab5ac']
+        """
+        return StreamedNotebook(filename)
+
+    @instrumented("Notebook.save")
+    def save(self, filename=None):
+        r"""Saves the notebook to an .ipynb file (by default, the file it
+        was loaded from).
+
+        If the notebook was loaded with `from_file` and this file has not
+        changed since, the save is incremental: only the new cells (cells
+        taken from another notebook included) and the dirty cells (see
+        `Cell.dirty`, changes made in place included) are serialized, the
+        other cells and the notebook header are copied byte for byte from
+        the original file (see `toolbox.splice_cells`), and the index of the
+        cells of the saved file is written along with it (see
+        `toolbox.load_cell_index`). Otherwise, the whole notebook is
+        serialized, with everything it was loaded with:
+        the outputs and metadata of its cells and the notebook metadata.
+
+        The cells of the file which are neither code nor markdown cells
+        (raw cells) are kept too, after the cell which preceded them in the
+        file (or the previous one still in the notebook).
+
+        Usage:
+
+            >>> nb = Notebook.from_file("samples/hello-world.ipynb")
+            >>> nb.cells[1].source = ['print("Hi!")']
+            >>> nb.save("samples/hello-world-save-load.ipynb")
+            >>> Notebook.from_file("samples/hello-world-save-load.ipynb").cells[1].source
+            ['print("Hi!")']
+            >>> nb.filename, nb.cells[1].dirty
+            ('samples/hello-world-save-load.ipynb', False)
+        """
+        filename = self.filename if filename is None else filename
+        if filename is None:
+            raise ValueError("no filename to save the notebook to")
+
+        items = self._file_cells()
+        cells = None
+        if self.filename is not None:
+            try:
+                index = toolbox.load_cell_index(self.filename)
+            except (OSError, ValueError):     # fichier d'origine supprimé ou abîmé
+                index = None
+            if (index is not None and index["array"] is not None
+                    and (index["size"], index["mtime_ns"]) == self._stat):
+                cells = [self._splice_cell(item) if isinstance(item, Cell) else item
+                         for item in items]
+        if cells is None:
+            _NotebookWriter(self, items).to_file(filename)
+        else:
+            toolbox.splice_cells(self.filename, cells, filename)
+
+        self._saved(filename, items)
+
+    def _file_cells(self):
+        # les cellules à écrire, dans l'ordre: celles du modèle, et les
+        # positions des cellules qu'il ne garde pas (raw...), chacune après
+        # la cellule qui la précédait dans le fichier
+        loaded = sorted(cell.position for cell in self.cells if self._owns(cell))
+        groups = {}
+        for position in self._others:
+            i = bisect.bisect(loaded, position)
+            groups.setdefault(loaded[i - 1] if i else None, []).append(position)
+        items = groups.pop(None, [])
+        for cell in self.cells:
+            items.append(cell)
+            if self._owns(cell):
+                items.extend(groups.pop(cell.position, ()))
+        return items
+
+    def _raw_cell(self, position):
+        return self._raw_cells[position]
+
+    def _saved(self, filename, items):
+        # le fichier écrit devient le nouvel original
+        stat = os.stat(filename)
+        self.filename = filename
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+        writer = _NotebookWriter(self, items)
+        raw_cells = []
+        others = []
+        for position, item in enumerate(items):
+            if isinstance(item, Cell):
+                if not self._owns(item) or item.dirty:
+                    item._ipynb = writer.serialize_cell(item)   # l'état enregistré
+                    item._ipynb["source"] = list(item.source)
+                item.position = position
+                item._dirty = False
+                raw_cells.append(item._ipynb)
+            else:
+                raw_cells.append(self._raw_cells[item])
+                others.append(position)
+        self._raw_cells = raw_cells
+        self._others = others
+
+    def _owns(self, cell):
+        # la cellule a-t-elle été chargée de ce fichier, à cette position?
+        # (une cellule d'un autre notebook est écrite comme une nouvelle)
+        position = cell.position
+        return (position is not None and position < len(self._raw_cells)
+                and self._raw_cells[position] is cell._ipynb)
+
+    def _splice_cell(self, cell):
+        if not self._owns(cell):        # nouvelle cellule
+            return _NotebookWriter(self, ()).serialize_cell(cell)
+        if not cell.dirty:
+            return cell.position
+        changes = {"source": cell.source}
+        if cell.id is not None:
+            changes["id"] = cell.id
+        if cell.cell_type == "code":
+            changes["execution_count"] = cell.execution_count
+            changes["outputs"] = [output.ipynb for output in cell.outputs]
+        return cell.position, changes
 
     def __iter__(self):
         r"""Iterate the cells of the notebook.
@@ -157,6 +449,64 @@ class Notebook:
         return iter(self.cells)
 
 
+class StreamedNotebook(Notebook):
+    r"""A Jupyter Notebook whose cells are streamed from its .ipynb file.
+
+    The cells are never held all at once: each iteration opens the file
+    again and builds the cells one at a time (see `toolbox.iter_cells`),
+    so notebooks larger than memory can go through the serializers cell by
+    cell. Changes made to the cells are therefore not kept, and `cells`
+    builds a new list on each access.
+
+    Args:
+        filename (str): the name of the .ipynb file.
+
+    Usage:
+
+        >>> nb = StreamedNotebook("samples/hello-world.ipynb")
+        >>> print(PyPercentSerializer(nb).to_py_percent().splitlines()[-1])
+        # Goodbye! 👋
+    """
+
+    def __init__(self, filename):
+        stat = os.stat(filename)
+        self._header = toolbox.get_header(filename)
+        self.version = toolbox.get_format_version(self._header)
+        self.filename = filename
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+
+    @property
+    def cells(self):
+        return list(self)
+
+    def _owns(self, cell):
+        return cell.position is not None      # relue du fichier à chaque itération
+
+    def _file_cells(self):
+        for position, ipynb in enumerate(toolbox.iter_cells(self.filename)):
+            cell = Notebook.make_cell(ipynb)
+            if cell is None:
+                yield position
+            else:
+                cell.position = position
+                yield cell
+
+    def _raw_cell(self, position):
+        return toolbox.get_cell(self.filename, position)
+
+    def __iter__(self):
+        for position, ipynb in enumerate(toolbox.iter_cells(self.filename)):
+            cell = Notebook.make_cell(ipynb)
+            if cell is not None:
+                cell.position = position
+                yield cell
+
+    def _saved(self, filename, items):
+        stat = os.stat(filename)
+        self.filename = filename
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+
+
 class PyPercentSerializer:
     r"""Prints a given Notebook in py-percent format.
 
@@ -184,21 +534,27 @@ class PyPercentSerializer:
     def to_py_percent(self):
         r"""Converts the notebook to a string in py-percent format.
         """
-        nb = Serializer(self.notebook)
-        myJSON = nb.serialize()
-        
-        raw = toolbox.to_percent(myJSON)
-        lst = raw.split("\n")    # On divise les lignes et ajoute le BLANKLINE
-        lst.insert(4,"")
-        lst.insert(7,"")
-        res = "\n".join(lst)     # On change la liste en str
-        return res
-        
+        return "".join(self.iter_py_percent())
 
+    def iter_py_percent(self):
+        r"""Iterates the notebook in py-percent format, one fragment (str) per cell.
 
+        The cells are converted straight from the notebook, one at a time.
+        """
+        cells = (
+            {"cell_type": cell.cell_type, "source": cell.source}
+            for cell in self.notebook
+            if cell.cell_type in ("code", "markdown")
+        )
+        return toolbox.iter_percent(cells)
+
+    @instrumented("PyPercentSerializer.to_file")
     def to_file(self, filename):
         r"""Serializes the notebook to a file
 
+        The cells are written one at a time into a temporary file, which
+        replaces `filename` once it is complete.
+
         Args:
             filename (str): the name of the file to write to.
 
@@ -208,10 +564,9 @@ class PyPercentSerializer:
                 >>> s = PyPercentSerializer(nb)
                 >>> s.to_file("samples/hello-world-serialized-py-percent.py")
         """
-        nb = PyPercentSerializer.to_py_percent(self)
-        f = open(filename, "w", encoding = "utf-8")
-        json.dump(nb, f)
-        f.close()
+        with toolbox.atomic_write(filename) as file:
+            for fragment in self.iter_py_percent():
+                file.write(fragment)
 
 
 
@@ -251,30 +606,57 @@ class Serializer:
     def __init__(self, notebook):
         self.notebook = notebook
 
+    @instrumented("Serializer.serialize", cells=lambda ipynb: len(ipynb["cells"]))
     def serialize(self):
         r"""Serializes the notebook to a JSON object
 
         Returns:
             dict: a dictionary representing the notebook.
         """
-        nb = self.notebook
         cells = []
-        for cell in nb.cells:
-            if isinstance(cell, CodeCell):
-                raw = {"cell_type": cell.cell_type, "execution_count": cell.execution_count, 
-                        "id": cell.id, "metadata": {}, "outputs": [], "source": cell.source}
+        for cell in self.notebook:
+            raw = self.serialize_cell(cell)
+            if raw is not None:
                 cells.append(raw)
-            elif isinstance(cell, MarkdownCell):
-                raw = {"cell_type": cell.cell_type, "id": cell.id, "metadata": {}, "source": cell.source}
-                cells.append(raw)
-        
-        my_JSON = {"cells": cells, "metadata": {}, "nbformat": int(nb.version[0]), "nbformat_minor": int(nb.version[-1])}
+
+        my_JSON = {"cells": cells}
+        my_JSON.update(self.serialize_header())
         return my_JSON
 
+    def serialize_cell(self, cell):
+        r"""Serializes a cell to a JSON object
 
+        Returns:
+            dict: a dictionary representing the cell (None for cells which
+            are neither code nor markdown cells).
+        """
+        if cell.cell_type == "code":
+            return {"cell_type": cell.cell_type, "execution_count": cell.execution_count, 
+                    "id": cell.id, "metadata": {}, "outputs": [], "source": cell.source}
+        elif cell.cell_type == "markdown":
+            return {"cell_type": cell.cell_type, "id": cell.id, "metadata": {}, "source": cell.source}
+        return None
+
+    def serialize_header(self):
+        r"""Serializes everything but the cells of the notebook to a JSON object
+
+        Returns:
+            dict: a dictionary with the notebook metadata and format version.
+        """
+        version = self.notebook.version
+        return {"metadata": {}, "nbformat": int(version[0]), "nbformat_minor": int(version[-1])}
+
+    def _cells(self):
+        return iter(self.notebook)
+
+    @instrumented("Serializer.to_file")
     def to_file(self, filename):
         r"""Serializes the notebook to a file
 
+        The cells are serialized and written one at a time into a temporary
+        file, which replaces `filename` once it is complete; the result is
+        the same as `toolbox.save_ipynb(self.serialize(), filename)`.
+
         Args:
             filename (str): the name of the file to write to.
 
@@ -290,15 +672,61 @@ class Serializer:
                 b777420a
                 a23ab5ac
         """
-        my_JSON = Serializer.serialize(self)
-        toolbox.save_ipynb(my_JSON, filename)
+        with toolbox.atomic_write(filename) as file:
+            file.write('{"cells": [')
+            separator = ""
+            for cell in self._cells():
+                raw = self.serialize_cell(cell)
+                if raw is not None:
+                    file.write(separator)
+                    file.write(json.dumps(raw))
+                    separator = ", "
+            # l'en-tête sans son "{" complète l'objet du notebook
+            file.write("], " + json.dumps(self.serialize_header())[1:])
 
 # +
+class _NotebookWriter(Serializer):
+    # Serializer ne garde que les sources: celui-ci écrit aussi tout ce que
+    # le notebook a gardé de son fichier (sorties, métadonnées, cellules
+    # brutes...), pour Notebook.save
+
+    def __init__(self, notebook, items):
+        super().__init__(notebook)
+        self.items = items      # voir Notebook._file_cells
+
+    def _cells(self):
+        return self.items
+
+    def serialize_cell(self, cell):
+        if isinstance(cell, int):       # cellule du fichier que le modèle ne garde pas
+            return self.notebook._raw_cell(cell)
+        raw = super().serialize_cell(cell)
+        if raw is None:
+            return None
+        if cell.id is None:     # ids optionnels avant nbformat 4.5
+            del raw["id"]
+        if cell.cell_type == "code":
+            raw["outputs"] = [output.ipynb for output in cell.outputs]
+        original = cell._ipynb
+        return {**original, **raw, "metadata": original.get("metadata", {})}
+
+    def serialize_header(self):
+        header = super().serialize_header()
+        header["metadata"] = self.notebook._header.get("metadata", {})
+        return header
+
+
 class Outliner:
     r"""Quickly outlines the strucure of the notebook in a readable format.
 
+    The outline of each cell is cached, by cell id, along with the cell
+    type, execution count and a hash of its source: outlining the notebook
+    again only renders the cells which have changed since.
+
     Args:
         notebook (Notebook): the notebook to outline.
+        cache (bool): whether to keep the outlines of the cells (False to
+            outline very large notebooks with `outline_iter`).
 
     Usage:
 
@@ -315,40 +743,73 @@ class Outliner:
                 └─▶ Markdown cell #a23ab5ac
                     | Goodbye! 👋
     """
-    def __init__(self, notebook):
+    def __init__(self, notebook, cache=True):
         self.notebook = notebook
+        self.cache = cache
+        self._fragments = {}    # id -> (clé, fragment)
 
+    @instrumented("Outliner.outline")
     def outline(self):
         r"""Outlines the notebook in a readable format.
 
         Returns:
             str: a string representing the outline of the notebook.
         """
-        res = f"Jupyter Notebook v{(self.notebook).version}"
-
-        for cell in (self.notebook).cells:
-            if isinstance(cell, CodeCell):
-                res += f"\n└─▶ Code cell #{cell.id} (1)"
-                if len(cell.source) == 1:
-                    res += "\n    | " + cell.source[0]
-                else:
-                    for idx, content in enumerate(cell.source):
-                        if idx == 0:
-                            res += "\n    ┌  " + content
-                        elif idx == len(cell.source) - 1:
-                            res += "\n    └  " + content
-                        else:
-                            res += "\n    |  " + content
-            elif isinstance(cell, MarkdownCell):
-                res += f"\n└─▶ Markdown cell #{cell.id}"
-                if len(cell.source) == 1:
-                    res += "\n    | " + cell.source[0]
-                else:
-                    for idx, content in enumerate(cell.source):
-                        if idx == 0:
-                            res += "\n    ┌  " + content
-                        elif idx == len(cell.source) - 1:
-                            res += "    └  " + content
-                        else:
-                            res += "    |  " + content
-        return res
\ No newline at end of file
+        return "\n".join(self.outline_iter())
+
+    def outline_iter(self):
+        r"""Iterates the outline of the notebook, one fragment (str, without
+        a final newline) for the header and then for each cell; the cells
+        are outlined one at a time, as the notebook is iterated.
+
+        Usage:
+
+            >>> nb = Notebook.from_file("samples/hello-world.ipynb")
+            >>> for fragment in Outliner(nb).outline_iter():
+            ...     print(fragment.splitlines()[0])
+            Jupyter Notebook v4.5
+            └─▶ Markdown cell #a9541506
+            └─▶ Code cell #b777420a (1)
+            └─▶ Markdown cell #a23ab5ac
+        """
+        yield f"Jupyter Notebook v{self.notebook.version}"
+        fragments = {}      # les cellules supprimées sortent du cache
+        for cell in self.notebook:
+            if cell.cell_type not in ("code", "markdown"):
+                continue
+            if not self.cache or cell.id is None:
+                yield Outliner.outline_cell(cell)
+                continue
+            key = (cell.cell_type, getattr(cell, "execution_count", None), hash(tuple(cell.source)))
+            cached = self._fragments.get(cell.id)
+            if cached is None or cached[0] != key:
+                cached = (key, Outliner.outline_cell(cell))
+            fragments[cell.id] = cached
+            yield cached[1]
+        if self.cache:
+            self._fragments = fragments
+
+    @staticmethod
+    def outline_cell(cell):
+        r"""Outlines a single (code or markdown) cell.
+
+        Returns:
+            str: the outline of the cell, without a final newline.
+        """
+        if cell.cell_type == "code":
+            count = "" if cell.execution_count is None else f" ({cell.execution_count})"
+            header = f"└─▶ Code cell #{cell.id}{count}"
+        else:
+            header = f"└─▶ Markdown cell #{cell.id}"
+        lines = "".join(cell.source).splitlines()
+        if len(lines) == 1:
+            return f"{header}\n    | {lines[0]}"
+        res = [header]
+        for idx, content in enumerate(lines):
+            if idx == 0:
+                res.append("    ┌  " + content)
+            elif idx == len(lines) - 1:
+                res.append("    └  " + content)
+            else:
+                res.append("    │  " + content)
+        return "\n".join(res)
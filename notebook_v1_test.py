@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
+import os
 import unittest
+from unittest import mock
 
 from notebook_v1 import *
 import notebook_v0 as toolbox
@@ -126,6 +129,285 @@ class Question14(unittest.TestCase):
     | Goodbye! 👋"""
             , strip_last_lines(o.outline())
             )
+class LazyOutputs(unittest.TestCase):
+    def test_stream_output(self):
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        outputs = nb.cells[1].outputs
+        self.assertEqual(1, len(outputs))
+        self.assertEqual("stream", outputs[0].output_type)
+        self.assertEqual("Hello world!\n", outputs[0].text)
+        self.assertIsNone(outputs[0].image)
+
+    def test_image_output_is_decoded_once(self):
+        nb = Notebook.from_file("samples/images.ipynb")
+        output = nb.cells[3].outputs[0]
+        self.assertNotIn("image", vars(output))    # rien n'est décodé au chargement
+        image = output.image
+        self.assertEqual((600, 512, 3), image.shape)
+        self.assertIs(image, output.image)
+
+class StreamingSerializers(unittest.TestCase):
+    def test_serializer_to_file(self):
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        s = Serializer(nb)
+        s.to_file("samples/hello-world-save-load.ipynb")
+        try:
+            with open("samples/hello-world-save-load.ipynb", encoding="utf-8") as file:
+                self.assertEqual(json.dumps(s.serialize()), file.read())
+        finally:
+            os.remove("samples/hello-world-save-load.ipynb")
+
+    def test_py_percent_serializer_to_file(self):
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        ppp = PyPercentSerializer(nb)
+        ppp.to_file("samples/hello-world-save-load.py")
+        try:
+            with open("samples/hello-world-save-load.py", encoding="utf-8") as file:
+                self.assertEqual(ppp.to_py_percent(), file.read())
+        finally:
+            os.remove("samples/hello-world-save-load.py")
+
+    def test_failed_write_keeps_the_file(self):
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        nb.cells[1].execution_count = object()     # pas sérialisable en JSON
+        Serializer(Notebook.from_file("samples/minimal.ipynb")).to_file(
+            "samples/hello-world-save-load.ipynb")
+        try:
+            with self.assertRaises(TypeError):
+                Serializer(nb).to_file("samples/hello-world-save-load.ipynb")
+            self.assertEqual([], toolbox.load_ipynb("samples/hello-world-save-load.ipynb")["cells"])
+            self.assertEqual([], [name for name in os.listdir("samples")
+                                  if name.startswith("hello-world-save-load.ipynb.")
+                                  and name.endswith(".tmp")])
+        finally:
+            os.remove("samples/hello-world-save-load.ipynb")
+
+class CompactCells(unittest.TestCase):
+    def test_cells_have_slots(self):
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        for cell in nb:
+            self.assertFalse(hasattr(cell, "__dict__"))
+        self.assertIs(nb.cells[0].cell_type, nb.cells[2].cell_type)
+        self.assertEqual("code", nb.cells[1].cell_type)
+
+    def test_string_sources_are_split_into_lines(self):
+        code = CodeCell({"cell_type": "code", "execution_count": None,
+                         "source": "x = 1\ny = 2", "outputs": []})
+        markdown = MarkdownCell({"cell_type": "markdown", "source": "# Title\n"})
+        self.assertEqual(["x = 1\n", "y = 2"], code.source)
+        self.assertEqual(["# Title\n"], markdown.source)
+
+    def test_sources_are_copied_on_first_access(self):
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        loaded = toolbox.PARSE_CACHE.load("samples/hello-world.ipynb")["cells"][0]["source"]
+        self.assertFalse(nb.cells[0].dirty)
+        self.assertIsNot(loaded, nb.cells[0].source)
+        self.assertEqual(loaded, nb.cells[0].source)
+        self.assertFalse(nb.cells[0].dirty)
+
+class ParseCaching(unittest.TestCase):
+    def test_from_file_uses_the_cache(self):
+        Notebook.from_file("samples/hello-world.ipynb")
+        hits = toolbox.PARSE_CACHE.hits
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        self.assertEqual(hits + 1, toolbox.PARSE_CACHE.hits)
+        nb.cells[0].source.append("changed")    # le cache n'est pas modifié
+        self.assertEqual(3, len(Notebook.from_file("samples/hello-world.ipynb").cells[0].source))
+
+    def test_changed_file_is_parsed_again(self):
+        cache = toolbox.ParseCache(hash_content=True)
+        toolbox.save_ipynb(toolbox.load_ipynb("samples/hello-world.ipynb"),
+                           "samples/cache-save-load.ipynb")
+        try:
+            self.assertEqual(3, len(cache.load("samples/cache-save-load.ipynb")["cells"]))
+            stat = os.stat("samples/cache-save-load.ipynb")
+            with open("samples/cache-save-load.ipynb", "r+", encoding="utf-8") as file:
+                content = file.read().replace("a9541506", "a9541507")
+                file.seek(0)
+                file.write(content)
+            # même taille et même date: seul le hash du contenu a changé
+            os.utime("samples/cache-save-load.ipynb", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            ipynb = cache.load("samples/cache-save-load.ipynb")
+            self.assertEqual("a9541507", ipynb["cells"][0]["id"])
+            self.assertEqual({"hits": 0, "misses": 2, "evictions": 0, "entries": 1,
+                              "bytes": stat.st_size * toolbox.PARSED_SIZE_FACTOR},
+                             cache.stats())
+        finally:
+            os.remove("samples/cache-save-load.ipynb")
+
+    def test_eviction(self):
+        cache = toolbox.ParseCache(max_bytes=1000 * toolbox.PARSED_SIZE_FACTOR)
+        cache.load("samples/hello-world.ipynb")      # 639 octets
+        cache.load("samples/metadata.ipynb")         # 715 octets
+        cache.load("samples/images.ipynb")           # trop gros pour le cache
+        self.assertEqual(1, cache.evictions)
+        self.assertEqual({"samples/metadata.ipynb"},
+                         {os.path.relpath(path) for path in cache._entries})
+        cache.load("samples/metadata.ipynb")
+        self.assertEqual(1, cache.hits)
+
+class IncrementalSave(unittest.TestCase):
+    def setUp(self):
+        with open("samples/images.ipynb", "rb") as file:
+            self.original = file.read()
+        with open("samples/incremental-save-load.ipynb", "wb") as file:
+            file.write(self.original)
+
+    def tearDown(self):
+        for filename in ("samples/incremental-save-load.ipynb",
+                         "samples/incremental-save-load.ipynb.idx"):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_unchanged_notebook_is_copied(self):
+        nb = Notebook.from_file("samples/incremental-save-load.ipynb")
+        nb.save()
+        with open("samples/incremental-save-load.ipynb", "rb") as file:
+            saved = file.read()
+        self.assertEqual(json.loads(self.original), json.loads(saved))
+
+    def test_only_dirty_cells_change(self):
+        nb = Notebook.from_file("samples/incremental-save-load.ipynb")
+        self.assertFalse(any(cell.dirty for cell in nb))
+        nb.cells[0].source = ["changed"]
+        self.assertTrue(nb.cells[0].dirty)
+        nb.save()
+        original = toolbox.load_ipynb("samples/images.ipynb")
+        saved = toolbox.load_ipynb("samples/incremental-save-load.ipynb")
+        self.assertEqual(["changed"], saved["cells"][0]["source"])
+        # les sorties et métadonnées sont conservées, y compris celles de la cellule modifiée
+        original["cells"][0]["source"] = ["changed"]
+        self.assertEqual(original, saved)
+
+    def test_changes_in_place_are_saved(self):
+        nb = Notebook.from_file("samples/incremental-save-load.ipynb")
+        nb.cells[1].source.append("# changed")
+        nb.cells[2].outputs.pop()
+        self.assertEqual([False, True, True, False], [cell.dirty for cell in nb])
+        nb.save()
+        self.assertFalse(any(cell.dirty for cell in nb))
+        saved = toolbox.load_ipynb("samples/incremental-save-load.ipynb")["cells"]
+        self.assertEqual("# changed", saved[1]["source"][-1])
+        self.assertEqual(len(nb.cells[2].outputs), len(saved[2]["outputs"]))
+        nb.cells[1].source.append("# again")
+        self.assertTrue(nb.cells[1].dirty)
+
+    def test_saved_file_is_indexed(self):
+        nb = Notebook.from_file("samples/incremental-save-load.ipynb")
+        nb.cells[0].source = ["changed"]
+        nb.cells.insert(0, MarkdownCell({"cell_type": "markdown", "id": "new", "source": ["New"]}))
+        nb.save()
+        index = toolbox._INDEXES[os.path.abspath("samples/incremental-save-load.ipynb")]
+        self.assertEqual(os.path.getsize("samples/incremental-save-load.ipynb"), index["size"])
+        toolbox._INDEXES.clear()
+        os.remove("samples/incremental-save-load.ipynb.idx")
+        self.assertEqual(toolbox.load_cell_index("samples/incremental-save-load.ipynb"), index)
+        self.assertEqual(["New"], toolbox.get_cell("samples/incremental-save-load.ipynb", "new")["source"])
+        self.assertEqual(["changed"], toolbox.get_cell("samples/incremental-save-load.ipynb", 1)["source"])
+
+    def test_cells_of_other_notebooks_are_new_cells(self):
+        nb = Notebook.from_file("samples/incremental-save-load.ipynb")
+        other = Notebook.from_file("samples/metadata.ipynb")
+        nb.cells.insert(1, other.cells[0])
+        nb.cells.append(other.cells[1])
+        nb.save()
+        saved = toolbox.load_ipynb("samples/incremental-save-load.ipynb")["cells"]
+        metadata = toolbox.load_ipynb("samples/metadata.ipynb")["cells"]
+        self.assertEqual(metadata[0], saved[1])
+        self.assertEqual(metadata[1], saved[-1])
+        self.assertEqual(6, len(saved))
+        # la cellule appartient maintenant au fichier enregistré
+        nb.save()
+        self.assertEqual(saved, toolbox.load_ipynb("samples/incremental-save-load.ipynb")["cells"])
+
+    def test_raw_cells_are_kept(self):
+        ipynb = toolbox.load_ipynb("samples/hello-world.ipynb")
+        raw = {"cell_type": "raw", "id": "r", "metadata": {}, "source": ["raw"]}
+        ipynb["cells"].insert(1, raw)
+        toolbox.save_ipynb(ipynb, "samples/incremental-save-load.ipynb")
+        nb = Notebook.from_file("samples/incremental-save-load.ipynb")
+        nb.save()
+        self.assertEqual(ipynb, toolbox.load_ipynb("samples/incremental-save-load.ipynb"))
+        # la cellule brute suit la cellule qui la précédait, ou la précédente restante
+        nb.cells.reverse()
+        nb.save()
+        cells = toolbox.load_ipynb("samples/incremental-save-load.ipynb")["cells"]
+        self.assertEqual(["a23ab5ac", "b777420a", "a9541506", "r"], [cell["id"] for cell in cells])
+        del nb.cells[2]
+        nb.cells[0].source = ["changed"]
+        with open("samples/incremental-save-load.ipynb", "ab") as file:
+            file.write(b"\n")      # écriture complète
+        nb.save()
+        cells = toolbox.load_ipynb("samples/incremental-save-load.ipynb")["cells"]
+        self.assertEqual(["a23ab5ac", "b777420a", "r"], [cell["id"] for cell in cells])
+        self.assertEqual(raw, cells[2])
+        Notebook.stream("samples/incremental-save-load.ipynb").save()
+        self.assertEqual(cells, toolbox.load_ipynb("samples/incremental-save-load.ipynb")["cells"])
+
+    def test_changed_file_is_fully_serialized(self):
+        original = toolbox.load_ipynb("samples/images.ipynb")
+        original["metadata"] = {"kernelspec": {"name": "python3"}}
+        original["cells"][0]["metadata"] = {"tags": ["keep"]}
+        toolbox.save_ipynb(original, "samples/incremental-save-load.ipynb")
+        nb = Notebook.from_file("samples/incremental-save-load.ipynb")
+        nb.cells.pop()
+        with open("samples/incremental-save-load.ipynb", "ab") as file:
+            file.write(b"\n")
+        nb.cells[0].source = ["changed"]
+        nb.save()
+        saved = Notebook.from_file("samples/incremental-save-load.ipynb")
+        self.assertEqual([cell.id for cell in nb], [cell.id for cell in saved])
+        # les sorties et métadonnées sont conservées, même sans copie du fichier
+        original["cells"].pop()
+        original["cells"][0]["source"] = ["changed"]
+        self.assertEqual(original, toolbox.load_ipynb("samples/incremental-save-load.ipynb"))
+
+class StreamedNotebooks(unittest.TestCase):
+    def test_same_cells_as_from_file(self):
+        nb = Notebook.from_file("samples/images.ipynb")
+        streamed = Notebook.stream("samples/images.ipynb")
+        self.assertEqual(nb.version, streamed.version)
+        for _ in range(2):      # le fichier est relu à chaque itération
+            self.assertEqual([(cell.id, cell.source) for cell in nb],
+                             [(cell.id, cell.source) for cell in streamed])
+        self.assertEqual(Serializer(nb).serialize(), Serializer(streamed).serialize())
+
+    def test_save_copies_the_cells(self):
+        try:
+            Notebook.stream("samples/images.ipynb").save("samples/streamed-save-load.ipynb")
+            self.assertEqual(toolbox.load_ipynb("samples/images.ipynb"),
+                             toolbox.load_ipynb("samples/streamed-save-load.ipynb"))
+        finally:
+            for filename in ("samples/streamed-save-load.ipynb",
+                             "samples/streamed-save-load.ipynb.idx"):
+                os.remove(filename)
+
+class IncrementalOutliner(unittest.TestCase):
+    def test_only_changed_cells_are_outlined(self):
+        nb = Notebook.from_file("samples/hello-world.ipynb")
+        outliner = Outliner(nb)
+        first = outliner.outline()
+        with mock.patch.object(Outliner, "outline_cell", wraps=Outliner.outline_cell) as outline_cell:
+            self.assertEqual(first, outliner.outline())
+            self.assertEqual(0, outline_cell.call_count)
+            nb.cells[1].execution_count = 2
+            nb.cells[2].source = ["Bye!"]
+            outline = outliner.outline()
+            self.assertEqual(2, outline_cell.call_count)
+        self.assertIn("Code cell #b777420a (2)", outline)
+        self.assertTrue(outline.endswith("    | Bye!"))
+        del nb.cells[0]
+        self.assertEqual(outline.split("\n", 5)[-1], outliner.outline().split("\n", 1)[-1])
+        self.assertEqual({"b777420a", "a23ab5ac"}, set(outliner._fragments))
+
+    def test_streamed_outline(self):
+        outliner = Outliner(Notebook.stream("samples/hello-world.ipynb"), cache=False)
+        fragments = list(outliner.outline_iter())
+        self.assertEqual(4, len(fragments))
+        self.assertEqual(Outliner(Notebook.from_file("samples/hello-world.ipynb")).outline(),
+                         "\n".join(fragments))
+        self.assertEqual({}, outliner._fragments)
+
 
 if __name__ == "__main__":
     unittest.main()
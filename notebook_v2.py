@@ -2,12 +2,23 @@
 # -*- coding: utf-8 -*-
 
 from json import tool
+import array
+import concurrent.futures
+import glob
+import itertools
+import os
+import uuid
+from pathlib import Path
+import numpy as np
 import notebook_v0 as toolbox
-from notebook_v1 import Serializer, PyPercentSerializer, Outliner
+from instrumentation import instrumented
+from notebook_v1 import Serializer, PyPercentSerializer, Outliner, Output
 """
 an object-oriented version of the notebook toolbox
 """
 class Cell:        
+    __slots__ = ("id", "source")     # pas de __dict__ par cellule
+
     def __init__(self, id, source):
         self.id = id
         self.source = source
@@ -19,11 +30,14 @@ class CodeCell(Cell):
         id (str): The unique ID of the cell.
         source (list): The source code of the cell, as a list of str.
         execution_count (int): The execution count of the cell.
+        outputs (list): The outputs of the cell, as a list of dict or Output
+            (defaults to no outputs).
 
     Attributes:
         id (str): The unique ID of the cell.
         source (list): The source code of the cell, as a list of str.
         execution_count (int): The execution count of the cell.
+        outputs (list): The outputs of the cell, as a list of Output (decoded lazily).
 
     Usage:
 
@@ -36,9 +50,16 @@ class CodeCell(Cell):
         >>> code_cell.source
         ['print("Hello world!")']
     """
-    def __init__(self, id, source, execution_count):
+    __slots__ = ("execution_count", "outputs")
+    cell_type = "code"
+
+    def __init__(self, id, source, execution_count, outputs=None):
         super().__init__(id, source)        # On hérite des propriétés de la classe parent
         self.execution_count = execution_count
+        self.outputs = [
+            output if isinstance(output, Output) else Output(output)
+            for output in outputs or []
+        ]
 
 class MarkdownCell(Cell):
     r"""A Cell of Markdown markup in a Jupyter notebook.
@@ -63,6 +84,9 @@ class MarkdownCell(Cell):
         >>> markdown_cell.source
         ['Hello world!', '============', 'Print `Hello world!`:']
     """
+    __slots__ = ()
+    cell_type = "markdown"
+
     def __init__(self, id, source):
         super().__init__(id, source)
 
@@ -128,25 +152,398 @@ class NotebookLoader:
     def __init__(self, filename):
         self.filename = filename
 
+    @instrumented("NotebookLoader.load", cells=lambda nb: len(nb.cells))
     def load(self):
         r"""Loads a Notebook instance from the file.
+
+        Notebooks small enough for the shared cache `toolbox.PARSE_CACHE`
+        are parsed only once while the file is unchanged; the cells of
+        larger ones are streamed from the file one at a time (see
+        `toolbox.iter_cells`), the JSON document is never loaded as a whole.
         """
-        nb = toolbox.load_ipynb(self.filename)
+        if toolbox.PARSE_CACHE.accepts(self.filename):
+            header = toolbox.PARSE_CACHE.load(self.filename)
+            cells = toolbox.get_cells(header)
+        else:
+            header = {}       # rempli par iter_cells (nbformat, metadata...)
+            cells = toolbox.iter_cells(self.filename, header)
+        return NotebookLoader._make_notebook(header, cells)
+
+    @staticmethod
+    def from_ipynb(ipynb):
+        r"""Builds a Notebook instance from a notebook dict (see
+        `toolbox.load_ipynb`).
+
+        Usage:
+
+            >>> nb = NotebookLoader.from_ipynb(toolbox.load_ipynb("samples/hello-world.ipynb"))
+            >>> [cell.id for cell in nb]
+            ['a9541506', 'b777420a', 'a23ab5ac']
+        """
+        return NotebookLoader._make_notebook(ipynb, toolbox.get_cells(ipynb))
 
+    @staticmethod
+    def _make_notebook(header, cells):
         res = []
-        for cell in toolbox.get_cells(nb):
-            if cell["cell_type"] == "code":
-                res.append(CodeCell(cell["id"], cell["source"], cell["execution_count"]))
-            elif cell["cell_type"] == "markdown":
-                res.append(MarkdownCell(cell["id"], cell["source"]))
-        return Notebook(toolbox.get_format_version(nb), res)
+        for cell in cells:
+            cell = NotebookLoader.make_cell(cell)
+            if cell is not None:
+                res.append(cell)
+        return Notebook(toolbox.get_format_version(header), res)
+
+    def stream(self):
+        r"""Opens the notebook with its cells streamed from the file, one at
+        a time, each time it is iterated (see `StreamedNotebook`).
+
+        Usage:
+
+            >>> nb = NotebookLoader("samples/hello-world.ipynb").stream()
+            >>> nb.version
+            '4.5'
+            >>> [cell.id for cell in MarkdownLesser(nb).remove_markdown_cells()]
+            ['b777420a']
+        """
+        return StreamedNotebook(self.filename)
+
+    @staticmethod
+    def make_cell(ipynb):
+        r"""Builds a CodeCell or a MarkdownCell from its dictionary
+        (None for the other cell types).
+        """
+        # les sources sont copiées: le dict peut être partagé (PARSE_CACHE)
+        if ipynb["cell_type"] == "code":
+            return CodeCell(ipynb.get("id"), toolbox.get_source_lines(ipynb), ipynb["execution_count"],
+                            ipynb["outputs"])
+        elif ipynb["cell_type"] == "markdown":
+            return MarkdownCell(ipynb.get("id"), toolbox.get_source_lines(ipynb))
+        return None
+
+    async def aload(self):
+        r"""Loads a Notebook instance from the file, without blocking the
+        asyncio event loop (the file is read on an I/O thread and parsed on
+        a worker process, see `toolbox.aload_ipynb`).
+
+        Usage:
+
+            >>> import asyncio
+            >>> nb = asyncio.run(NotebookLoader("samples/hello-world.ipynb").aload())
+            >>> nb.version
+            '4.5'
+        """
+        return NotebookLoader.from_ipynb(await toolbox.aload_ipynb(self.filename))
+
+
+class StreamedNotebook(Notebook):
+    r"""A Jupyter Notebook whose cells are streamed from its .ipynb file.
+
+    The cells are never held all at once: each iteration opens the file
+    again and builds the cells one at a time (see `toolbox.iter_cells`),
+    so pipelines such as `MarkdownLesser` then `PyPercentSerializer` handle
+    notebooks larger than memory cell by cell. Changes made to the cells
+    are not kept, and `cells` builds a new list on each access.
+
+    Args:
+        filename (str): The name of the .ipynb file.
+
+    Usage:
+
+        >>> nb = StreamedNotebook("samples/hello-world.ipynb")
+        >>> code = MarkdownLesser(nb).remove_markdown_cells()
+        >>> PyPercentSerializer(code).to_file("samples/hello-world-py-percent.py")
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.version = toolbox.get_format_version(toolbox.get_header(filename))
+
+    @property
+    def cells(self):
+        return list(self)
+
+    def __iter__(self):
+        for ipynb in toolbox.iter_cells(self.filename):
+            cell = NotebookLoader.make_cell(ipynb)
+            if cell is not None:
+                yield cell
+
+
+def _load_notebook(filename):
+    return NotebookLoader(filename).load()
+
+
+_CHECKPOINTS = ".ipynb_checkpoints"      # copies de sauvegarde de Jupyter
+
+
+class CorpusLoader:
+    r"""Loads many Jupyter Notebooks in parallel, from a directory or a glob pattern.
+
+    Args:
+        location (str): A directory (all the .ipynb files below it are
+            loaded) or a glob pattern (recursive `**` allowed).
+        max_workers (int): The number of worker processes (defaults to the
+            number of processors).
+        max_pending (int): The maximum number of notebooks being loaded or
+            waiting to be yielded at any time (defaults to twice the
+            number of workers).
+
+    Usage:
+
+        >>> loader = CorpusLoader("samples/[ems]*s.ipynb", max_workers=2)
+        >>> for filename, nb in sorted(loader.load(), key=lambda item: item[0]):
+        ...     print(filename, nb.version, len(nb.cells))
+        samples/errors.ipynb 4.2 2
+        samples/streams.ipynb 4.2 2
+    """
+
+    def __init__(self, location, max_workers=None, max_pending=None):
+        self.location = location
+        self.max_workers = max_workers or os.cpu_count()
+        self.max_pending = max_pending or 2 * self.max_workers
+
+    def filenames(self):
+        r"""Returns the names of the notebook files to load (sorted), without
+        the copies saved by Jupyter in `.ipynb_checkpoints` directories.
+        """
+        if os.path.isdir(self.location):
+            paths = Path(self.location).rglob("*.ipynb")
+        else:
+            paths = map(Path, glob.glob(str(self.location), recursive=True))
+        return sorted(str(path) for path in paths if _CHECKPOINTS not in path.parts)
+
+    def load(self):
+        r"""Loads the notebooks on a process pool, and yields `(filename, notebook)`
+        pairs as soon as they are loaded (not in filename order); `notebook`
+        is the exception raised instead if the file could not be loaded.
+        """
+        filenames = iter(self.filenames())
+        with concurrent.futures.ProcessPoolExecutor(
+                self.max_workers, mp_context=toolbox.process_context()) as executor:
+            pending = {}
+            while True:
+                # on ne soumet de nouveaux fichiers que si la file n'est pas pleine
+                for filename in itertools.islice(filenames, self.max_pending - len(pending)):
+                    pending[executor.submit(_load_notebook, filename)] = filename
+                if not pending:
+                    return
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    filename = pending.pop(future)
+                    try:
+                        notebook = future.result()
+                    except Exception as error:
+                        yield filename, error
+                    else:
+                        yield filename, notebook
+
+
+class NotebookCorpus:
+    r"""A collection of Jupyter Notebooks, stored by columns for fast aggregates.
+
+    Every cell attribute is stored for all the cells of all the notebooks
+    in a single NumPy array, so that aggregate queries are vectorized
+    operations instead of loops over cell objects.
+
+    Args:
+        notebooks (iterable): The notebooks (Notebook instances).
+
+    Attributes:
+        versions (list): The version of the format of every notebook.
+        notebook (numpy.ndarray): The index of the notebook of every cell.
+        cell_type (numpy.ndarray): The type of every cell (CODE or MARKDOWN).
+        execution_count (numpy.ndarray): The execution count of every cell
+            (-1 for markdown cells and code cells which were never executed).
+        source_lines (numpy.ndarray): The number of lines of every cell source.
+
+    Usage:
+
+        >>> corpus = NotebookCorpus.from_files(
+        ...     ["samples/hello-world.ipynb", "samples/streams.ipynb", "samples/minimal.ipynb"])
+        >>> len(corpus)
+        5
+        >>> corpus.count(NotebookCorpus.CODE)
+        3
+        >>> corpus.count(NotebookCorpus.CODE, per_notebook=True)
+        array([1, 2, 0])
+        >>> corpus.total_source_lines()
+        8
+        >>> corpus.execution_counts()
+        array([0, 2, 1])
+    """
+
+    MARKDOWN = 0
+    CODE = 1
+
+    def __init__(self, notebooks):
+        self.versions = []
+        notebook_column = array.array("q")
+        cell_type_column = array.array("B")
+        execution_count_column = array.array("q")
+        source_lines_column = array.array("q")
+        for index, nb in enumerate(notebooks):
+            self.versions.append(nb.version)
+            for cell in nb:
+                notebook_column.append(index)
+                if cell.cell_type == "code":
+                    cell_type_column.append(self.CODE)
+                    execution_count = cell.execution_count
+                    execution_count_column.append(-1 if execution_count is None else execution_count)
+                else:
+                    cell_type_column.append(self.MARKDOWN)
+                    execution_count_column.append(-1)
+                source_lines_column.append(len(cell.source))
+        # les array.array sont convertis sans copie
+        self.notebook = np.frombuffer(notebook_column, dtype=np.int64)
+        self.cell_type = np.frombuffer(cell_type_column, dtype=np.uint8)
+        self.execution_count = np.frombuffer(execution_count_column, dtype=np.int64)
+        self.source_lines = np.frombuffer(source_lines_column, dtype=np.int64)
+
+    @classmethod
+    @instrumented("NotebookCorpus.from_files", cells=len)
+    def from_files(cls, filenames):
+        r"""Builds a corpus from .ipynb files, loaded one at a time with NotebookLoader.
+        """
+        return cls(NotebookLoader(filename).load() for filename in filenames)
+
+    def __len__(self):
+        r"""The number of cells in the corpus.
+        """
+        return len(self.cell_type)
+
+    def _mask(self, cell_type):
+        if cell_type is None:
+            return np.ones(len(self), dtype=bool)
+        return self.cell_type == cell_type
+
+    def count(self, cell_type=None, per_notebook=False):
+        r"""Counts the cells (of a given type, if any), in total or per notebook.
+        """
+        mask = self._mask(cell_type)
+        if per_notebook:
+            return np.bincount(self.notebook[mask], minlength=len(self.versions))
+        return int(np.count_nonzero(mask))
+
+    def total_source_lines(self, cell_type=None, per_notebook=False):
+        r"""Sums the number of source lines of the cells (of a given type, if
+        any), in total or per notebook.
+        """
+        mask = self._mask(cell_type)
+        if per_notebook:
+            return np.bincount(self.notebook[mask], weights=self.source_lines[mask],
+                               minlength=len(self.versions)).astype(np.int64)
+        return int(self.source_lines[mask].sum())
+
+    def execution_counts(self):
+        r"""Returns the distribution of the execution counts of the code cells:
+        the number of cells executed with each execution count (as an array
+        indexed by execution count).
+        """
+        counts = self.execution_count[self.execution_count >= 0]
+        return np.bincount(counts)
+
+
+class NotebookView(Notebook):
+    r"""A lazy view of a notebook through a pipeline of transforms.
+
+    Each stage is an object with a `transform(cells)` method, which takes
+    an iterable of cells and returns (or yields) the transformed cells, such
+    as `Markdownizer`, `MarkdownLesser`, `CellFilter` or `CellMap`. Nothing
+    is computed nor copied until the view is iterated (for instance by a
+    `Serializer`); then all the stages run in a single pass over the cells
+    of the original notebook, which is never modified. A view of a view
+    shares the pipeline of its parent instead of stacking notebooks.
+
+    Args:
+        notebook (Notebook): The notebook to transform.
+        stages: The transforms, applied in order.
+
+    Attributes:
+        version (str): The version of the notebook format.
+        cells (list): The transformed cells (computed on each access).
+
+    Usage:
+
+        >>> nb = NotebookLoader("samples/hello-world.ipynb").load()
+        >>> view = NotebookView(nb, Markdownizer(), CellMap(lambda cell: cell.id))
+        >>> list(view)
+        ['a9541506', 'b777420a', 'a23ab5ac']
+        >>> view = NotebookView(nb).filter(lambda cell: cell.cell_type == "code")
+        >>> [cell.source for cell in view]
+        [['print("Hello world!")']]
+        >>> nb.cells[1].source
+        ['print("Hello world!")']
+    """
+
+    def __init__(self, notebook, *stages):
+        if isinstance(notebook, NotebookView):
+            stages = notebook.stages + stages
+            notebook = notebook.notebook
+        self.notebook = notebook
+        self.version = notebook.version
+        self.stages = stages
+
+    @property
+    def cells(self):
+        return list(self)
+
+    def __iter__(self):
+        cells = iter(self.notebook)
+        for stage in self.stages:
+            cells = stage.transform(cells)
+        return iter(cells)
+
+    def then(self, *stages):
+        r"""Returns a view with some more stages at the end of the pipeline.
+        """
+        return NotebookView(self, *stages)
+
+    def filter(self, predicate):
+        r"""Returns a view of the cells for which `predicate(cell)` is true.
+        """
+        return self.then(CellFilter(predicate))
+
+    def map(self, function):
+        r"""Returns a view of the cells transformed by `function(cell)`.
+        """
+        return self.then(CellMap(function))
+
+    def materialize(self):
+        r"""Returns the transformed notebook as a (plain) Notebook.
+        """
+        return Notebook(self.version, self.cells)
+
+
+class CellFilter:
+    r"""A pipeline stage which keeps the cells for which `predicate(cell)` is true.
+    """
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def transform(self, cells):
+        return filter(self.predicate, cells)
+
+
+class CellMap:
+    r"""A pipeline stage which replaces each cell by `function(cell)`.
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def transform(self, cells):
+        return map(self.function, cells)
 
 
 class Markdownizer:
     r"""Transforms a notebook to a pure markdown notebook.
 
+    Code cells become markdown cells with their code in a python code
+    block; the cells of the original notebook are not modified.
+
     Args:
-        notebook (Notebook): The notebook to transform.
+        notebook (Notebook): The notebook to transform (None if the
+            Markdownizer is only used as a stage of a `NotebookView`).
 
     Usage:
 
@@ -161,33 +558,37 @@ class Markdownizer:
         a23ab5ac
         >>> isinstance(nb2.cells[1], MarkdownCell)
         True
+        >>> nb2.cells[1].source
+        ["'''python", 'print("Hello world!")', "'''"]
         >>> Serializer(nb2).to_file("samples/hello-world-markdown.ipynb")
     """
 
-    def __init__(self, notebook):
+    def __init__(self, notebook=None):
         self.notebook = notebook
 
     def markdownize(self):
         r"""Transforms the notebook to a pure markdown notebook.
+
+        Returns:
+            NotebookView: a lazy view of the transformed notebook.
         """
-        nb = self.notebook
+        return NotebookView(self.notebook, self)
 
-        res = []
-        for cell in nb:
+    def transform(self, cells):
+        r"""Transforms cells to markdown cells, lazily.
+        """
+        for cell in cells:
             if isinstance(cell, CodeCell):
-                raw = cell.source
-                raw.append ("'''")           # à la fin de la liste 
-                raw.insert(0, "'''python")   # au début de la liste
-                res.append(MarkdownCell(cell.id, raw))
+                yield MarkdownCell(cell.id, ["'''python", *cell.source, "'''"])
             elif isinstance(cell, MarkdownCell):
-                res.append(cell)
-        return Notebook(nb.version, res) 
+                yield cell
 
 class MarkdownLesser:
     r"""Removes markdown cells from a notebook.
 
     Args:
-        notebook (Notebook): The notebook to transform.
+        notebook (Notebook): The notebook to transform (None if the
+            MarkdownLesser is only used as a stage of a `NotebookView`).
 
     Usage:
 
@@ -198,24 +599,21 @@ class MarkdownLesser:
             └─▶ Code cell #b777420a (1)
                 | print("Hello world!")
     """
-    def __init__(self, notebook):
+    def __init__(self, notebook=None):
         self.notebook = notebook
 
     def remove_markdown_cells(self):
         r"""Removes markdown cells from the notebook.
 
         Returns:
-            Notebook: a Notebook instance with only code cells
+            NotebookView: a lazy view of the notebook with only code cells
         """
-        nb = self.notebook
+        return NotebookView(self.notebook, self)
 
-        res = []
-        for cell in nb:
-            if isinstance(cell, CodeCell):     # On ne garde que les cellues de la classe CodeCell
-                res.append(cell)
-            elif isinstance(cell, MarkdownCell):
-                pass
-        return Notebook(nb.version, res)
+    def transform(self, cells):
+        r"""Keeps only the code cells, lazily.
+        """
+        return (cell for cell in cells if isinstance(cell, CodeCell))
 
 
 class PyPercentLoader:
@@ -245,8 +643,56 @@ class PyPercentLoader:
         self.filename = filename
         self.version = version
 
+    @instrumented("PyPercentLoader.load", cells=lambda nb: len(nb.cells))
     def load(self):
         r"""Loads a Notebook instance from the py-percent file.
+
+        The file is parsed line by line, in a single pass: a `# %%` line
+        starts a code cell, and a `# %% [markdown]` line starts a markdown
+        cell, whose lines are commented out (`# `). Since py-percent files
+        do not store cell ids, new ids are generated.
+
+        Usage:
+
+            >>> nb = PyPercentLoader("samples/hello-world-py-percent.py").load()
+            >>> for cell in nb:
+            ...     print(type(cell).__name__, cell.source)
+            MarkdownCell ['Hello world!\n', '============\n', 'Print `Hello world!`:']
+            CodeCell ['print("Hello world!")']
+            MarkdownCell ['Goodbye! 👋']
+        """
+        cells = []
+        with open(self.filename, encoding="utf-8") as file:
+            cell_type, lines = "code", []     # le code avant le premier "# %%"
+            for line in file:
+                if line.startswith("# %%"):
+                    cell = self.make_cell(cell_type, lines)
+                    if cell is not None:
+                        cells.append(cell)
+                    header = line[len("# %%"):]
+                    cell_type = "markdown" if ("[markdown]" in header or "[md]" in header) else "code"
+                    lines = []
+                elif cell_type == "markdown" and line.startswith("#"):
+                    lines.append(line[2:] if line.startswith("# ") else line[1:])
+                else:
+                    lines.append(line)
+            cell = self.make_cell(cell_type, lines)
+            if cell is not None:
+                cells.append(cell)
+        return Notebook(self.version, cells)
+
+    @staticmethod
+    def make_cell(cell_type, lines):
+        r"""Builds a cell from its type and its lines, without the blank
+        lines which separate it from the next cell (None if there is
+        nothing left).
         """
-        f = toolbox.load_ipynb(self.filename)
-        return Notebook("4.5",f)
+        while lines and not lines[-1].strip():
+            lines.pop()
+        if not lines:
+            return None
+        lines[-1] = lines[-1].rstrip("\n")     # comme dans les .ipynb
+        cell_id = uuid.uuid4().hex[:8]
+        if cell_type == "markdown":
+            return MarkdownCell(cell_id, lines)
+        return CodeCell(cell_id, lines, None)
@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import shutil
 import unittest
 
+import notebook_v0 as toolbox
+import notebook_v1
+
 from notebook_v1 import *
 from notebook_v2 import *
 
@@ -79,6 +84,161 @@ class Question19(unittest.TestCase):
         self.assertIsInstance(nb2.cells[1], CodeCell)
         self.assertIsInstance(nb2.cells[2], MarkdownCell)
 
+class LazyOutputs(unittest.TestCase):
+    def test_load_outputs(self):
+        nb = NotebookLoader("samples/hello-world.ipynb").load()
+        self.assertEqual(1, len(nb.cells[1].outputs))
+        self.assertEqual("Hello world!\n", nb.cells[1].outputs[0].text)
+
+    def test_default_outputs(self):
+        code_cell = CodeCell("b777420a", ['print("Hello world!")'], 1)
+        self.assertEqual([], code_cell.outputs)
+
+class Serializers(unittest.TestCase):
+    def test_serialize_notebook_v2(self):
+        nb = NotebookLoader("samples/hello-world.ipynb").load()
+        ipynb = Serializer(nb).serialize()
+        self.assertEqual(["markdown", "code", "markdown"],
+                         [cell["cell_type"] for cell in ipynb["cells"]])
+        nb1 = notebook_v1.Notebook.from_file("samples/hello-world.ipynb")
+        self.assertEqual(Serializer(nb1).serialize(), ipynb)
+
+class PyPercentParser(unittest.TestCase):
+    def test_round_trip(self):
+        nb = NotebookLoader("samples/hello-world.ipynb").load()
+        PyPercentSerializer(nb).to_file("samples/hello-world-py-percent.py")
+        nb2 = PyPercentLoader("samples/hello-world-py-percent.py").load()
+        self.assertEqual([cell.source for cell in nb], [cell.source for cell in nb2])
+        self.assertEqual(
+            PyPercentSerializer(nb).to_py_percent(), PyPercentSerializer(nb2).to_py_percent()
+        )
+
+    def test_code_before_first_header_and_empty_lines(self):
+        with open("samples/parser-save-load.py", "w", encoding="utf-8") as file:
+            file.write("import os\n\n# %% [markdown]\n# Title\n#\n# text\n\n\n"
+                       "# %%\nx = 1\n\ny = 2\n")
+        try:
+            nb = PyPercentLoader("samples/parser-save-load.py").load()
+        finally:
+            os.remove("samples/parser-save-load.py")
+        self.assertEqual(["code", "markdown", "code"], [cell.cell_type for cell in nb])
+        self.assertEqual(["import os"], nb.cells[0].source)
+        self.assertEqual(["Title\n", "\n", "text"], nb.cells[1].source)
+        self.assertEqual(["x = 1\n", "\n", "y = 2"], nb.cells[2].source)
+
+class CompactCells(unittest.TestCase):
+    def test_cells_have_slots(self):
+        for cell in NotebookLoader("samples/hello-world.ipynb").load():
+            self.assertFalse(hasattr(cell, "__dict__"))
+
+    def test_string_sources_are_split_into_lines(self):
+        cell = NotebookLoader.make_cell(
+            {"cell_type": "code", "execution_count": 1, "source": "x = 1\ny = 2", "outputs": []})
+        self.assertEqual(["x = 1\n", "y = 2"], cell.source)
+        cell = NotebookLoader.make_cell({"cell_type": "markdown", "source": "# Title"})
+        self.assertEqual(["# Title"], cell.source)
+
+class Corpus(unittest.TestCase):
+    def test_corpus_columns(self):
+        filenames = ["samples/hello-world.ipynb", "samples/images.ipynb"]
+        corpus = NotebookCorpus.from_files(filenames)
+        notebooks = [NotebookLoader(filename).load() for filename in filenames]
+        cells = [cell for nb in notebooks for cell in nb]
+        self.assertEqual(len(cells), len(corpus))
+        self.assertEqual(["4.5", "4.2"], corpus.versions)
+        self.assertEqual(sum(isinstance(cell, CodeCell) for cell in cells),
+                         corpus.count(NotebookCorpus.CODE))
+        self.assertEqual(sum(len(cell.source) for cell in cells), corpus.total_source_lines())
+        self.assertEqual([sum(len(cell.source) for cell in nb) for nb in notebooks],
+                         list(corpus.total_source_lines(per_notebook=True)))
+
+    def test_execution_counts(self):
+        nb = Notebook("4.5", [
+            CodeCell("a", ["1"], 2), CodeCell("b", ["2"], None),
+            MarkdownCell("c", ["3"]), CodeCell("d", ["4"], 2),
+        ])
+        corpus = NotebookCorpus([nb])
+        self.assertEqual([2, -1, -1, 2], list(corpus.execution_count))
+        self.assertEqual([0, 0, 2], list(corpus.execution_counts()))
+
+class ParallelLoading(unittest.TestCase):
+    def test_load_directory(self):
+        loaded = dict(CorpusLoader("samples", max_workers=2, max_pending=2).load())
+        self.assertIn("samples/hello-world.ipynb", loaded)
+        self.assertEqual(sorted(loaded), CorpusLoader("samples").filenames())
+        nb = loaded["samples/hello-world.ipynb"]
+        self.assertEqual(["a9541506", "b777420a", "a23ab5ac"], [cell.id for cell in nb])
+
+    def test_checkpoints_are_skipped(self):
+        directory = "samples/.ipynb_checkpoints"
+        os.mkdir(directory)
+        try:
+            shutil.copyfile("samples/hello-world.ipynb",
+                            f"{directory}/hello-world-checkpoint.ipynb")
+            for location in ("samples", "samples/**/*.ipynb", f"{directory}/*.ipynb"):
+                filenames = CorpusLoader(location).filenames()
+                self.assertFalse([name for name in filenames if "checkpoint" in name])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_errors_are_yielded(self):
+        with open("samples/broken-save-load.ipynb", "w", encoding="utf-8") as file:
+            file.write('{"cells": [')
+        try:
+            (filename, error), = CorpusLoader("samples/broken-*.ipynb").load()
+        finally:
+            os.remove("samples/broken-save-load.ipynb")
+        self.assertEqual("samples/broken-save-load.ipynb", filename)
+        self.assertIsInstance(error, ValueError)
+
+class Pipelines(unittest.TestCase):
+    def test_transforms_do_not_modify_the_notebook(self):
+        nb = NotebookLoader("samples/hello-world.ipynb").load()
+        sources = [list(cell.source) for cell in nb]
+        nb2 = Markdownizer(nb).markdownize()
+        self.assertEqual(["'''python", 'print("Hello world!")', "'''"], nb2.cells[1].source)
+        self.assertIsInstance(nb.cells[1], CodeCell)
+        self.assertEqual(sources, [cell.source for cell in nb])
+
+    def test_chained_stages_run_in_one_pass(self):
+        nb = NotebookLoader("samples/hello-world.ipynb").load()
+        seen = []
+        view = NotebookView(nb).map(lambda cell: seen.append(cell.id) or cell)
+        view = MarkdownLesser(view).remove_markdown_cells()
+        view = Markdownizer(view).markdownize()
+        self.assertEqual(3, len(view.stages))
+        self.assertIs(nb, view.notebook)
+        self.assertEqual([], seen)
+        self.assertEqual(["b777420a"], [cell.id for cell in view])
+        self.assertEqual(["a9541506", "b777420a", "a23ab5ac"], seen)
+        plain = view.materialize()
+        self.assertIsInstance(plain.cells[0], MarkdownCell)
+        self.assertEqual(
+            Serializer(plain).serialize(), Serializer(view).serialize())
+
+class StreamedNotebooks(unittest.TestCase):
+    def test_streamed_pipeline(self):
+        nb = NotebookLoader("samples/images.ipynb").load()
+        streamed = NotebookLoader("samples/images.ipynb").stream()
+        self.assertEqual(nb.version, streamed.version)
+        self.assertEqual(
+            PyPercentSerializer(MarkdownLesser(nb).remove_markdown_cells()).to_py_percent(),
+            PyPercentSerializer(MarkdownLesser(streamed).remove_markdown_cells()).to_py_percent(),
+        )
+
+    def test_file_is_read_again(self):
+        toolbox.save_ipynb(toolbox.load_ipynb("samples/hello-world.ipynb"),
+                           "samples/streamed-save-load.ipynb")
+        try:
+            nb = StreamedNotebook("samples/streamed-save-load.ipynb")
+            self.assertEqual(3, len(nb.cells))
+            ipynb = toolbox.load_ipynb("samples/streamed-save-load.ipynb")
+            del ipynb["cells"][0]
+            toolbox.save_ipynb(ipynb, "samples/streamed-save-load.ipynb")
+            self.assertEqual(["b777420a", "a23ab5ac"], [cell.id for cell in nb])
+        finally:
+            os.remove("samples/streamed-save-load.ipynb")
+
 
 if __name__ == "__main__":
     import doctest